@@ -1,6 +1,24 @@
 import math
 from utils.scaleCoordinates import scale_coords
-from ultralytics import YOLO
+from utils.modelRegistry import get_model, default_device
+from utils.detectorBackends import export_model
+from utils.interpolateBoxes import interpolate_detections
+from utils.motionGate import ChangeGate
+from utils.cascade import DetectorCascade
+from utils.trackGuided import TrackGuidedDetector
+from utils.pipeline import Pipeline
+from utils.seamRotation import sample_frame_indices, rotation_from_detections
+from utils.roiBand import band_from_detections, clamp_band, crop_band, shift_detections
+from utils.adaptiveResolution import choose_imgsz
+from utils.tiling import tile_origins, cut_tile, merge_tile_detections
+from utils.detectionStore import DetectionStore, detections_to_array, as_detection_store
+from utils.detectionCache import DetectionCache, DEFAULT_CACHE_DIR, video_fingerprint, weights_id, cache_key
+from utils.runCheckpoint import RunCheckpoint, RunCancelled
+from utils.videoReader import open_video, DecodedGeometry
+from utils.assignment import ASSIGNMENT_MODES, assign, track_costs
+from utils.kalmanTracker import TRACKER_ENGINES, KalmanTracker
+from utils.trackState import BOX_DTYPE, Tracks, resume_tracks, frame_boxes, frames_to_json
+from utils.boxGeometry import overlap_areas, center_distances, points_in_boxes, unrotate_x
 import numpy as np
 import matplotlib.pyplot as plt
 from utils.csvReader import read as csvRead
@@ -8,78 +26,332 @@ import cv2
 import os
 import json
 import shutil
-import copy
 import csv
 import itertools
 import torch
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from moviepy.editor import concatenate_videoclips
 
-# Load model and run inference on the video
-def run_detection(video, progress=None):
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    model = YOLO("yolov8x.pt").to(device)
-    cap = cv2.VideoCapture(video)
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)  # Keep FPS as float for more accurate timing
-    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+# Frame 0 of the detections and of the bounding box JSON is this frame of the video
+FIRST_FRAME = 120
+
+# Rotate the image horizontally (wrap around)
+def rotate_image(image, rotate_amount):
+    return np.roll(image, rotate_amount, axis=1)
+
+
+def iter_frames(cap, first_frame, num_frames=None):
+    """
+    Yield first_frame followed by the remaining frames of an already positioned capture.
+
+    Stops after num_frames frames, or at the end of the video when num_frames is None.
+    """
+    yield first_frame
+    for i in (range(1, num_frames) if num_frames is not None else itertools.count(1)):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
+
+def iter_rotated_frames(cap, rotate_amount, first_frame, num_frames):
+    """
+    Yield the rotated frames of an already positioned capture, starting with first_frame.
+
+    The frames are rotated in memory as they are decoded so they can be handed
+    straight to the detector without an intermediate video file.
+    """
+    for frame in iter_frames(cap, first_frame, num_frames):
+        yield rotate_image(frame, rotate_amount)
+
+
+def batched(iterable, batch_size):
+    """Group an iterable into lists of at most batch_size items, keeping the order."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def predict_batched(model, frames, batch_size=1, **predict_kwargs):
+    """
+    Run the model on batch_size frames per forward pass.
+
+    Yields the Boxes of every frame in the same order the frames were produced,
+    which is the order reID expects.
+    """
+    for batch in batched(frames, max(1, int(batch_size))):
+        for result in model.predict(source=batch, verbose=False, **predict_kwargs):
+            yield result.boxes
+
+
+def predict_tiled(model, frames, tile_overlap=256, nms_threshold=0.5, **predict_kwargs):
+    """
+    Detect people at full resolution by splitting each frame into overlapping imgsz tiles.
+
+    The tiles wrap around the 0/width seam, all tiles of a frame go through the
+    model as one batch and duplicates across tile borders are merged with a
+    wrap-aware NMS. Yields (N, 6) detection arrays in frame order.
+    """
+    tile_size = predict_kwargs.get("imgsz", 1920)
+    for frame in frames:
+        frame_height, frame_width = frame.shape[:2]
+        origins = tile_origins(frame_width, frame_height, tile_size, tile_overlap)
+        tiles = [cut_tile(frame, x, y, tile_size) for x, y in origins]
+        tile_detections = [detections_to_array(result.boxes) for result in model.predict(source=tiles, verbose=False, **predict_kwargs)]
+        yield merge_tile_detections(tile_detections, origins, frame_width, nms_threshold, tile_size, frame_height)
+
+
+def predict_strided(detect, frames, stride, frame_width, max_shift=80, max_count_change=0):
+    """
+    Run detect on every stride-th frame and interpolate the boxes of the frames in between.
+
+    detect maps a list of frames to a list of (N, 6) detection arrays. When two
+    consecutive keyframes disagree (box count changed or someone moved more than
+    max_shift pixels) the frames between them are detected normally. Yields
+    detection arrays in frame order. Only stride frames are held in memory at a time.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+    previous = detect([first])[0]
+    yield previous
+    while True:
+        window = list(itertools.islice(frames, stride))
+        if not window:
+            return
+        keyframe = detect(window[-1:])[0]
+        between = window[:-1]
+        interpolated = interpolate_detections(previous, keyframe, len(between), frame_width, max_shift, max_count_change)
+        if interpolated is None:
+            interpolated = detect(between) if between else []
+        yield from interpolated
+        yield keyframe
+        previous = keyframe
+
+
+def predict_motion_gated(detect, frames, gate, batch_size=1):
+    """
+    Run detect only on frames the ChangeGate considers changed, reusing the last detections otherwise.
+
+    The gate decision only depends on the frames themselves, so the frames that do
+    need the detector are still sent batch_size at a time. Yields one result per
+    frame in order.
+    """
+    pending = []  # (needs detection, frame) in frame order
+    last = None
+
+    def flush():
+        nonlocal last
+        detected = iter(detect([frame for needs_detection, frame in pending if needs_detection]))
+        for needs_detection, _ in pending:
+            if needs_detection:
+                last = next(detected)
+            yield last
+        pending.clear()
+
+    for frame in frames:
+        needs_detection = gate.should_detect(frame)
+        pending.append((needs_detection, frame if needs_detection else None))
+        if sum(1 for item in pending if item[0]) >= batch_size:
+            yield from flush()
+    if pending:
+        yield from flush()
+
+
+def detect_frames(model, frames, frame_width, predict_kwargs, batch_size=1, stride=1, max_shift=80, max_count_change=0,
+                  tiled=False, tile_overlap=256, motion_threshold=None, max_skip_interval=30, stats=None, roi_band=None,
+                  light_model=None, light_conf=0.25, escalate_conf=0.6, track_guided=False, crop_size=640,
+                  full_interval=30):
+    """
+    Run the selected detection mode over an iterator of rotated frames.
+
+    Yields one detection result per frame in order, either ultralytics Boxes or
+    (N, 6) arrays depending on the mode; pass them through detections_to_array
+    for a uniform layout. Motion gating (motion_threshold) takes precedence over
+    striding; its skipped frame count is printed and stored in stats["motion_gate"].
+    With roi_band (top, bottom) only those rows go through the detector and the
+    boxes are shifted back to full-frame coordinates.
+
+    With a light_model every frame that does get detected first goes through it at
+    light_conf, and only the frames DetectorCascade finds ambiguous go through
+    model; the escalation counts end up in stats["cascade"].
+
+    With track_guided the people of the previous frame are followed with
+    crop_size crops around their predicted positions, detected at full resolution,
+    and the whole frame is only detected every full_interval frames or when the
+    crops lose someone (see TrackGuidedDetector); the counts end up in
+    stats["track_guided"].
+    """
+    def run_model(detector, batch, kwargs):
+        if roi_band is not None:
+            batch = [crop_band(frame, roi_band) for frame in batch]
+        if tiled:
+            detections = list(predict_tiled(detector, batch, tile_overlap, **kwargs))
+        else:
+            detections = list(predict_batched(detector, batch, batch_size, **kwargs))
+        if roi_band is not None:
+            detections = [shift_detections(detections_to_array(boxes), roi_band[0]) for boxes in detections]
+        return detections
+
+    def detect(batch):
+        return run_model(model, batch, predict_kwargs)
+
+    counters = {}
+    if light_model is not None:
+        cascade = DetectorCascade(frame_width, escalate_conf, predict_kwargs.get("conf", 0.5))
+        light_kwargs = dict(predict_kwargs, conf=light_conf)
+        counters["cascade"] = cascade
+        heavy_detect = detect
+
+        def detect(batch):
+            return cascade.detect(batch, lambda frames: run_model(light_model, frames, light_kwargs), heavy_detect)
+
+    if track_guided:
+        guide = TrackGuidedDetector(frame_width, crop_size, full_interval)
+        # The crops are detected at their own size, so every crop pixel reaches the model
+        crop_kwargs = dict(predict_kwargs, imgsz=crop_size)
+        counters["track_guided"] = guide
+        full_detect = detect
+
+        def detect_crops(crops):
+            return list(predict_batched(model, crops, len(crops), **crop_kwargs))
+
+        def detect(batch):
+            return guide.detect(batch, full_detect, detect_crops)
+
+    if motion_threshold is not None:
+        gate = ChangeGate(motion_threshold, max_skip_interval)
+        counters["motion_gate"] = gate
+        detections = predict_motion_gated(detect, frames, gate, batch_size)
+    elif stride > 1:
+        detections = predict_strided(lambda batch: [detections_to_array(boxes) for boxes in detect(batch)],
+                                     frames, stride, frame_width, max_shift, max_count_change)
+    else:
+        detections = (boxes for batch in batched(frames, batch_size) for boxes in detect(batch))
+    return _report_counters(detections, counters, stats) if counters else detections
 
-    # Extract the first frame
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 120)
-    ret, first_frame = cap.read()
 
+def _report_counters(detections, counters, stats):
+    yield from detections
+    for name, counter in counters.items():
+        print(counter.report())
+        if stats is not None:
+            stats[name] = counter.as_dict()
+
+
+def segment_bounds(start_frame, end_frame, shards):
+    """Split [start_frame, end_frame) into at most shards contiguous (start, end) segments."""
+    step = max(1, math.ceil((end_frame - start_frame) / shards))
+    return [(start, min(start + step, end_frame)) for start in range(start_frame, end_frame, step)]
+
+
+def detect_segment(video, start_frame, end_frame, rotate_amount, weights, imgsz, predict_kwargs, detect_options, num_threads=None,
+                   backend="torch", cascade_weights=None, decoder=None):
+    """
+    Detect people in frames [start_frame, end_frame) of a video, end_frame None reads to the end.
+
+    Runs in a worker process of the sharded mode: the segment is decoded with its
+    own capture seek (open_video with the decoder options), rotated by the shared
+    rotate_amount and returned in source pixels as a DetectionStore, which is also
+    cheap to send back to the parent process.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model = get_model(weights, predict_kwargs["device"], imgsz, backend)
+    light_model = get_model(cascade_weights, predict_kwargs["device"], imgsz, backend) if cascade_weights else None
+    cap = open_video(video, **(decoder or {}))
+    frame_width = cap.source_width
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    ret, first_frame = cap.read()
     if not ret:
-        print("Failed to read the video.")
         cap.release()
-        return None, None
+        return DetectionStore(frame_width=frame_width)
+    geometry = DecodedGeometry(cap, rotate_amount)
+    num_frames = end_frame - start_frame if end_frame is not None else None
+    frames = iter_rotated_frames(cap, geometry.rotate_amount, first_frame, num_frames)
+    detect_options = dict(detect_options, roi_band=geometry.band(detect_options.get("roi_band")))
+    detections = detect_frames(model, frames, geometry.width, predict_kwargs, light_model=light_model, **detect_options)
+    results = DetectionStore.from_frames((geometry.to_source(detections_to_array(boxes)) for boxes in detections),
+                                         frame_width)
+    cap.release()
+    return results
+
+
+def run_sharded_detection(video, start_frame, end_frame, rotate_amount, weights, imgsz, predict_kwargs, detect_options,
+                          shards, progress=None, backend="torch", cascade_weights=None, decoder=None):
+    """Detect the frame range in shards worker processes and stitch the per-frame results back in order."""
+    segments = segment_bounds(start_frame, end_frame, shards)
+    # The last segment reads to the end in case the container's frame count is short
+    segments[-1] = (segments[-1][0], None)
+    num_threads = max(1, (os.cpu_count() or 1) // len(segments))
+    segment_results = [None] * len(segments)
+    with ProcessPoolExecutor(max_workers=len(segments), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(detect_segment, video, start, end, rotate_amount, weights, imgsz, predict_kwargs,
+                                   detect_options, num_threads, backend, cascade_weights, decoder): index
+                   for index, (start, end) in enumerate(segments)}
+        for done, future in enumerate(as_completed(futures)):
+            segment_results[futures[future]] = future.result()
+            if progress is not None:
+                progress.emit(int((done + 1) / len(segments) * 70))
+    return DetectionStore.concatenate(segment_results, segment_results[0].frame_width)
 
-    # Make a prediction on the first frame
-    results_first_frame = model(first_frame, classes=[0], conf=0.5, iou=0.4, device=device, imgsz=1920)
-    boxes_first_frame = results_first_frame[0].boxes
 
-    # Extract edges of the bounding boxes
-    box_edges = [(box.xywh[0][0].item() - box.xywh[0][2].item() / 2, 
-                  box.xywh[0][0].item() + box.xywh[0][2].item() / 2) for box in boxes_first_frame]
+def read_frames_at(video, frame_indices, reader="opencv", width=None, threads=0):
+    """Decode the frames at the given indices with a capture of their own (see open_video)."""
+    cap = open_video(video, reader, width, threads)
+    frames = []
+    for index in frame_indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
 
-    # Sort by the left edge of the boxes
-    box_edges = sorted(box_edges, key=lambda x: x[0])
 
-    # Calculate gaps between the right edge of one box and the left edge of the next box
-    gaps = [(box_edges[i+1][0] - box_edges[i][1], i) for i in range(len(box_edges)-1)]
+def detect_samples(model, frames, predict_kwargs, batch_size=8):
+    """Full-frame person detections of the sample frames as (N, 6) arrays."""
+    return [detections_to_array(boxes) for boxes in predict_batched(model, frames, batch_size, **predict_kwargs)]
 
-    # Add gaps between the last box and the first box for wrap-around calculation
-    wrap_around_gap = (frame_width - box_edges[-1][1] + box_edges[0][0], len(box_edges)-1)
-    gaps.append(wrap_around_gap)
 
-    # Sort gaps in descending order
-    gaps.sort(reverse=True, key=lambda x: x[0])
+def estimate_rotation(detections, frame_width):
+    """
+    Return the horizontal roll that moves the least occupied column onto the seam.
 
-    # Determine the rotation amount to center the largest gap
-    largest_gap_index = gaps[0][1]
+    The person boxes of the sample frames are accumulated into a coverage
+    histogram over the horizontal axis, so one crowded or empty frame cannot pick
+    a bad seam. Returns 0 (no rotation) when nobody is detected in any of the samples.
+    """
+    rotate_amount = rotation_from_detections(detections, frame_width)
+    if rotate_amount is None:
+        print("No people detected in the sampled frames, leaving the video unrotated.")
+        return 0
+    return rotate_amount
 
-    # Calculate center of largest gap
-    if largest_gap_index == len(box_edges) - 1:
-        # Gap between last and first box (wrap-around)
-        gap_center = (box_edges[0][0] + frame_width + box_edges[-1][1]) / 2
-        if gap_center > frame_width:
-            gap_center -= frame_width
-    else:
-        # Regular gap
-        gap_center = (box_edges[largest_gap_index][1] + box_edges[largest_gap_index + 1][0]) / 2
 
-    # Calculate rotation amount to bring gap center to frame center
-    rotate_amount = int(frame_width / 2 - gap_center)
-    rotate_amount = rotate_amount + frame_width // 2
+def estimate_roi_band(detections, frame_height, margin=0.15):
+    """
+    Return the (top, bottom) band of rows the people in the sample frames occupy.
 
-    # Create a function to rotate the image horizontally (wrap around)
-    def rotate_image(image, rotate_amount):
-        return np.roll(image, rotate_amount, axis=1)
+    People in an equirectangular frame stay near the horizon, so the floor and
+    ceiling rows can be left out of inference. Returns the whole frame height when
+    nobody is detected in any of the samples.
+    """
+    band = band_from_detections(detections, frame_height, margin)
+    if band is None:
+        print("No people detected in the sampled frames, detecting on the whole frame height.")
+        return 0, frame_height
+    return band
 
-    # Rotate the first frame
-    rotated_frame = rotate_image(first_frame, rotate_amount)
 
-    # Create a folder for saving rotated video
+def create_output_folder(video):
+    """Create a unique rotated_<name> folder for the run, reID names the JSON after it."""
     output_folder = f"rotated_{video.split('/')[-1].split('.')[0]}"
     counter = 1
     unique_output_folder = output_folder  # Store the base folder name
@@ -90,20 +362,328 @@ def run_detection(video, progress=None):
 
     # Create the unique directory
     os.makedirs(unique_output_folder, exist_ok=True)
-    output_path = os.path.join(unique_output_folder, 'rotated_video.mp4')
+    return os.path.join(unique_output_folder, 'rotated_video.mp4')
+
+
+# Load model and run inference on the video
+def run_detection(video, progress=None, save_rotated=False, batch_size=1, weights="yolov8x.pt", imgsz=1920,
+                  conf=0.5, iou=0.4, use_cache=True, cache_dir=DEFAULT_CACHE_DIR, stride=1, max_shift=80,
+                  max_count_change=0, tiled=False, tile_overlap=256, pipelined=False, queue_depth=4, stats=None,
+                  shards=1, rotation_samples=8, motion_threshold=None, max_skip_interval=30,
+                  backend="torch", roi_band=None, roi_margin=0.15, probe_imgsz=2560, target_person_height=64,
+                  cascade_weights=None, cascade_conf=0.25, escalate_conf=0.6, track_guided=False, crop_size=640,
+                  full_interval=30, checkpoint_every=500, cancel=None, video_reader="opencv", decode_width=None,
+                  decode_threads=0, online_tracking=False, assignment="optimal", tracker_engine="overlap"):
+    """
+    Detect people in a 360 video after rotating the largest gap between people onto the seam.
+
+    By default the frames are rotated in memory and streamed into the detector in a
+    single decoding pass, batch_size frames per forward pass. Set save_rotated to also
+    write rotated_<name>/rotated_video.mp4 and run the detector on that file, as the
+    original pipeline did.
+
+    The model comes from the process-wide registry, so queued GUI tasks and batch
+    runs reuse the already loaded weights. backend selects how the weights are run:
+    "torch" directly, or "onnx"/"openvino" through a copy exported once next to the
+    weights, which is much faster on CPU-only machines. With use_cache the raw detections are
+    stored in cache_dir, keyed by the video fingerprint and detector parameters, and
+    a rerun on the same video returns them without running the detector.
+
+    With stride > 1 only every stride-th frame is detected and the boxes of the
+    frames in between are interpolated (see predict_strided). With tiled each frame
+    is detected as overlapping imgsz tiles at full resolution (see predict_tiled).
+    Striding and tiling apply to the in-memory path only, save_rotated always
+    detects every whole frame.
+
+    With pipelined the decode, rotate, inference and post-processing stages run on
+    their own threads connected by queues of at most queue_depth items, so decoding
+    overlaps with inference. Pass a dict as stats to receive the per-stage counters.
+
+    The seam rotation is estimated from rotation_samples frames spread over the
+    video (see estimate_rotation).
+
+    With motion_threshold set, frames whose scene barely changed since the last
+    detected frame reuse its detections, with a real detection at least every
+    max_skip_interval frames (see ChangeGate).
+
+    With shards > 1 the frame range is split into that many segments which are
+    decoded and detected in separate worker processes, all using the rotation
+    computed here, and stitched back together in frame order.
+
+    roi_band restricts inference to a horizontal band of rows: a (top, bottom)
+    pixel range, or "auto" to learn it from the person boxes of the rotation
+    samples, padded by roi_margin of its height (see estimate_roi_band). The boxes
+    are returned in full-frame coordinates either way. Like striding and tiling it
+    only applies to the in-memory path.
+
+    With imgsz="auto" the rotation samples are detected at probe_imgsz and the
+    smallest imgsz at which the small people are still target_person_height pixels
+    tall is used for the rest of the video (see choose_imgsz). The choice and its
+    expected cost are stored in results.metadata["resolution"], which reID writes
+    to the output JSON.
+
+    With cascade_weights (e.g. "yolov8n.pt") that light model detects every frame at
+    cascade_conf and weights only run on the frames where its output is ambiguous
+    (see DetectorCascade). How many frames escalated is printed and stored in
+    stats["cascade"] and, for unsharded runs, results.metadata["cascade"].
+
+    With track_guided the frames between full detections every full_interval
+    frames are only detected in crop_size crops around the people of the previous
+    frame (see TrackGuidedDetector), which suits scenes with a handful of people.
+
+    With checkpoint_every the in-memory path appends its detections in chunks of
+    that many frames to a run directory under cache_dir/runs (see RunCheckpoint).
+    Running the same video with the same settings again resumes after the last
+    complete chunk, and reID continues the run's tracking chunks the same way.
+    cancel is polled after every frame; when it returns True the frames detected
+    so far are written as a last chunk and RunCancelled is raised.
+
+    video_reader, decode_width and decode_threads select how the frames for the
+    detector are decoded (see open_video): with decode_width, e.g. the imgsz the
+    model resizes to anyway, the "ffmpeg" reader has the decoder scale the frames
+    in decode_threads threads instead of copying full 5760x2880 frames around.
+    Boxes, rotate_amount and the region of interest stay in source pixels. The
+    save_rotated path always decodes at full size.
+
+    With online_tracking every frame goes through an OnlineTracker as soon as it is
+    detected, so tracking overlaps with inference, and reID writes the tracks kept
+    in results.tracks instead of tracking the whole video afterwards; assignment
+    and tracker_engine select the tracker as in reID. The tracker only knows the
+    people seen so far, so it can start a track that reID, which caps tracks at
+    the most people in any frame of the video, would not.
+    """
+    auto_imgsz = imgsz == "auto"
+    if auto_imgsz:
+        if tiled:
+            raise ValueError("imgsz='auto' does not apply to tiled detection, tiles are always imgsz pixels")
+        imgsz = probe_imgsz
+    # Exported backends are meant for CPU-only machines
+    device = default_device() if backend == "torch" else 'cpu'
+    predict_kwargs = dict(classes=[0], conf=conf, iou=iou, device=device, imgsz=imgsz)
+    detector_params = dict(weights=weights_id(weights), classes=[0], conf=conf, iou=iou, imgsz=imgsz, backend=backend)
+    cache_params = dict(detector_params)
+    if stride > 1 and not save_rotated:
+        cache_params.update(stride=stride, max_shift=max_shift, max_count_change=max_count_change)
+    if tiled and not save_rotated:
+        cache_params.update(tiled=True, tile_overlap=tile_overlap)
+    if motion_threshold is not None and not save_rotated:
+        cache_params.update(motion_threshold=motion_threshold, max_skip_interval=max_skip_interval)
+    if cascade_weights and not save_rotated:
+        cache_params.update(cascade_weights=weights_id(cascade_weights), cascade_conf=cascade_conf,
+                            escalate_conf=escalate_conf)
+    if track_guided and not save_rotated:
+        cache_params.update(track_guided=True, crop_size=crop_size, full_interval=full_interval)
+    if shards > 1 and not save_rotated and (stride > 1 or motion_threshold is not None or track_guided):
+        # These modes start afresh at every segment boundary, so the shards change their output
+        cache_params.update(shards=shards)
+    if decode_width and not save_rotated:
+        cache_params.update(video_reader=video_reader, decode_width=decode_width)
+    # The rotated video written by save_rotated needs the full-size frames
+    decoder = dict(reader=video_reader, width=None if save_rotated else decode_width, threads=decode_threads)
+    cap = open_video(video, **decoder)
+    frame_width = cap.source_width
+    frame_height = cap.source_height
+    tracker = OnlineTracker(frame_width, assignment=assignment, engine=tracker_engine) if online_tracking else None
+    fps = cap.get(cv2.CAP_PROP_FPS)  # Keep FPS as float for more accurate timing
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    # Extract the first frame
+    cap.set(cv2.CAP_PROP_POS_FRAMES, FIRST_FRAME)
+    ret, first_frame = cap.read()
+
+    if not ret:
+        print("Failed to read the video.")
+        cap.release()
+        return None, None
+
+    cache = DetectionCache(cache_dir) if use_cache else None
+    fingerprint = video_fingerprint(video) if use_cache or checkpoint_every else None
+    rotation_params = dict(detector_params, rotation_samples=rotation_samples)
+    rotate_amount = cache.load_rotation(fingerprint, rotation_params) if use_cache else None
+
+    band = None
+    learn_band = roi_band == "auto" and not save_rotated
+    if learn_band:
+        band_params = dict(rotation_params, roi_margin=roi_margin)
+        band = cache.load_roi_band(fingerprint, band_params) if use_cache else None
+        learn_band = band is None
+    elif roi_band is not None and not save_rotated:
+        band = clamp_band(roi_band, frame_height)
+
+    resolution = None
+    if auto_imgsz:
+        resolution_params = dict(rotation_params, roi_band=roi_band if roi_band == "auto" else band,
+                                 target_person_height=target_person_height)
+        resolution = cache.load_resolution(fingerprint, resolution_params) if use_cache else None
+
+    model = None
+    if rotate_amount is None or learn_band or (auto_imgsz and resolution is None):
+        # The rotation, the band and the resolution are learned from the same sample detections
+        model = get_model(weights, device, imgsz, backend)
+        sample_frames = read_frames_at(video, sample_frame_indices(FIRST_FRAME, num_frames, rotation_samples), **decoder)
+        sample_geometry = DecodedGeometry(cap)
+        sample_detections = [sample_geometry.to_source(detections)
+                             for detections in detect_samples(model, sample_frames or [first_frame], predict_kwargs)]
+        del sample_frames
+        if rotate_amount is None:
+            rotate_amount = estimate_rotation(sample_detections, frame_width)
+            if use_cache:
+                cache.save_rotation(fingerprint, rotation_params, rotate_amount)
+        if learn_band:
+            band = estimate_roi_band(sample_detections, frame_height, roi_margin)
+            if use_cache:
+                cache.save_roi_band(fingerprint, band_params, band)
+        if auto_imgsz and resolution is None:
+            band_height = band[1] - band[0] if band is not None else frame_height
+            resolution = choose_imgsz(sample_detections, frame_width, band_height, target_person_height)
+            if use_cache:
+                cache.save_resolution(fingerprint, resolution_params, resolution)
+    metadata = {}
+    if resolution is not None:
+        if backend != "torch" and imgsz != resolution["imgsz"]:
+            # Exported graphs have a fixed input size, the probe model cannot run at the chosen one
+            model = None
+        imgsz = resolution["imgsz"]
+        predict_kwargs["imgsz"] = imgsz
+        cache_params["imgsz"] = imgsz
+        metadata["resolution"] = dict(resolution, probe_imgsz=probe_imgsz)
+        print(f"Detecting at imgsz={imgsz}, {resolution['relative_cost']:.2f}x the cost of imgsz=1920")
+    if band is not None:
+        # Cached detections depend on the band itself, not on how it was chosen
+        cache_params.update(roi_band=list(band))
+        print(f"Detecting on rows {band[0]}-{band[1]} of {frame_height}")
+
+    output_path = create_output_folder(video)
+    run_dir = None
+    if checkpoint_every:
+        run_dir = os.path.join(cache_dir, "runs", cache_key(fingerprint, rotate_amount=rotate_amount, **cache_params))
+
+    if use_cache:
+        cached_results = cache.load(fingerprint, cache_params, rotate_amount)
+        if cached_results is not None:
+            print(f"Loaded cached detections for {video}")
+            cached_results.frame_width = frame_width
+            cached_results.metadata.update(metadata)
+            if run_dir is not None and os.path.isdir(run_dir):
+                # The tracking of this run was interrupted, let reID resume it
+                cached_results.run_dir = run_dir
+            cap.release()
+            feed_tracker(tracker, cached_results)
+            if progress is not None:
+                progress.emit(70)
+            return output_path, cached_results, rotate_amount
+
+    detect_options = dict(batch_size=batch_size, stride=stride, max_shift=max_shift, max_count_change=max_count_change,
+                          tiled=tiled, tile_overlap=tile_overlap, motion_threshold=motion_threshold,
+                          max_skip_interval=max_skip_interval, roi_band=band, light_conf=cascade_conf,
+                          escalate_conf=escalate_conf, track_guided=track_guided, crop_size=crop_size,
+                          full_interval=full_interval)
+
+    if shards > 1 and not save_rotated:
+        # Each worker process decodes its own segment with the rotation computed above
+        cap.release()
+        if backend != "torch":
+            # Export up front so the workers do not race to write the same artifact
+            export_model(weights, backend, imgsz)
+            if cascade_weights:
+                export_model(cascade_weights, backend, imgsz)
+        results = run_sharded_detection(video, FIRST_FRAME, num_frames, rotate_amount, weights, imgsz, predict_kwargs,
+                                        detect_options, shards, progress, backend, cascade_weights, decoder)
+        if use_cache:
+            cache.save(fingerprint, cache_params, rotate_amount, results)
+        results.metadata.update(metadata)
+        return output_path, feed_tracker(tracker, results), rotate_amount
+
+    if model is None:
+        model = get_model(weights, device, imgsz, backend)
+
+    if not save_rotated:
+        # Single pass: rotate each decoded frame in memory and feed batches of them to the model,
+        # keeping only the compact array form of each frame's detections
+        light_model = get_model(cascade_weights, device, imgsz, backend) if cascade_weights else None
+        run_stats = stats if stats is not None else {}
+        checkpoint = None
+        done = 0
+        if run_dir is not None:
+            checkpoint = RunCheckpoint(run_dir, checkpoint_every, dict(cache_params, video=video, rotate_amount=rotate_amount))
+            done = checkpoint.detected_frames
+        if done:
+            # Stride, motion gating and track guidance start afresh at the resume point
+            print(f"Resuming {video} after {done} already detected frames")
+            results = checkpoint.load_detections(frame_width)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, FIRST_FRAME + done)
+            ret, first_frame = cap.read()
+        else:
+            results = DetectionStore(frame_width=frame_width)
+
+        def decode(_):
+            if not ret or (checkpoint is not None and checkpoint.detection_complete):
+                return iter(())
+            # Read to the end like the last shard does, the container's frame count can be short
+            return iter_frames(cap, first_frame)
+
+        # Decoded frames may be smaller than the source, the detections are mapped back in post_process
+        geometry = DecodedGeometry(cap, rotate_amount)
+        decoded_options = dict(detect_options, roi_band=geometry.band(band))
+
+        def rotate(frames):
+            return (rotate_image(frame, geometry.rotate_amount) for frame in frames)
+
+        def infer(frames):
+            return detect_frames(model, frames, geometry.width, predict_kwargs, stats=run_stats, light_model=light_model,
+                                 **decoded_options)
+
+        def post_process(detections):
+            return (geometry.to_source(detections_to_array(boxes)) for boxes in detections)
+
+        if pipelined:
+            pipeline = Pipeline([("decode", decode), ("rotate", rotate), ("infer", infer), ("post-process", post_process)], queue_depth)
+            detections = pipeline
+        else:
+            detections = post_process(infer(rotate(decode(None))))
+        chunk = DetectionStore(frame_width=frame_width)
+        cancelled = False
+        for i, boxes in enumerate(detections, done):
+            results.append(boxes)
+            feed_tracker(tracker, results)
+            if checkpoint is not None:
+                chunk.append(boxes)
+                if len(chunk) == checkpoint_every:
+                    checkpoint.append_detections(chunk)
+                    chunk = DetectionStore(frame_width=frame_width)
+            if progress is not None:
+                progress_percentage = min(int((i + 1) / num_frames * 70), 70)
+                progress.emit(progress_percentage)
+            if cancel is not None and cancel():
+                cancelled = True
+                break
+        cap.release()
+        if checkpoint is not None:
+            checkpoint.append_detections(chunk)
+        if cancelled:
+            # The rerun that resumes creates the folder again, under the same name
+            shutil.rmtree(os.path.dirname(output_path), ignore_errors=True)
+            raise RunCancelled(f"Detection of {video} cancelled after {len(results)} frames")
+        if checkpoint is not None:
+            checkpoint.finish_detections()
+            results.run_dir = checkpoint.run_dir
+        if pipelined:
+            print(pipeline.report())
+            run_stats.update({stage.name: stage.as_dict() for stage in pipeline.stats})
+        for name in ("cascade", "track_guided"):
+            if name in run_stats:
+                metadata[name] = run_stats[name]
+        if use_cache:
+            cache.save(fingerprint, cache_params, rotate_amount, results)
+        results.metadata.update(metadata)
+        return output_path, feed_tracker(tracker, results), rotate_amount
 
     # Save the rotated frames to the video
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Use 'mp4v' codec for mp4 files
     out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
     print(output_path)
-    out.write(rotated_frame)
 
-    # Process the rest of the video with YOLO after rotating
-    for i in range(1, num_frames):
-        ret, frame = cap.read()
-        if not ret:
-            break
-        rotated_frame = rotate_image(frame, rotate_amount)
+    for i, rotated_frame in enumerate(iter_rotated_frames(cap, rotate_amount, first_frame, num_frames)):
         if progress is not None:
             progress_percentage = int((i + 1) / (num_frames * 2) * 70)  # *2 because rotation + detection
             progress.emit(progress_percentage)
@@ -119,20 +699,21 @@ def run_detection(video, progress=None):
         return None, None
 
     # Re-run detection on the rotated video
-    if progress is not None:
-        results = []
-        frames_processed = 0
-        for result in model.predict(source=output_path, stream=True, exist_ok=True, classes=[0], conf=0.5, iou=0.4, device=device, imgsz=1920):
-            results.append(result.boxes)
-            frames_processed += 1
-
-            # Update progress during YOLO detection
+    results = DetectionStore(frame_width=frame_width)
+    frames_processed = 0
+    for result in model.predict(source=output_path, stream=True, exist_ok=True, **predict_kwargs):
+        results.append(result.boxes)
+        feed_tracker(tracker, results)
+        frames_processed += 1
+
+        # Update progress during YOLO detection
+        if progress is not None:
             progress_percentage = int(((num_frames + frames_processed) / (num_frames * 2)) * 70)  # Second phase progress
             progress.emit(progress_percentage)
-    else: 
-        results = model.predict(source=output_path, stream=True, exist_ok=True, classes=[0], conf=0.5, iou=0.4, device=device, imgsz=1920)
-        results = [result.boxes for result in results]
 
+    if use_cache:
+        cache.save(fingerprint, cache_params, rotate_amount, results)
+    results.metadata.update(metadata)
     return output_path, results, rotate_amount
 
 plt.switch_backend('Agg')
@@ -225,114 +806,30 @@ def filter_list(gazeData, frame):
 
 
 
-def intersect(gazePoint, boundingBoxes, graph, rotate_amount):
-
-    #iterate through all bounding boxes for this frame
-    for box in boundingBoxes:
-        #get bounding box coordinates
-        x1 = box["box"][0] 
-        y1 = box["box"][1]
-        x2 = x1 + box["box"][2]
-        y2 = y1 + box["box"][3]
-
-
-        #convert to floats
-        x1 = float(x1)
-        x2 = float(x2)
-        y1 = float(y1)
-        y2 = float(y2)
-
-        #iterate through all gaze point for this frame
-        for x, y in zip(gazePoint.x, gazePoint.y):
-            x = int((float(x) - rotate_amount) % 5760)
-            y = int(float(y))
-            #check if gaze point is within bounding box
-            if x1 < x and x < x2 and y1 < y and y < y2:
-                    graph.update(gazePoint.time, str(box["id"]))
+def intersect(gazePoint, boundingBoxes, graph, rotate_amount, frame_width=5760):
+    if not boundingBoxes or not gazePoint.x:
+        return
+    #gaze points of this frame in the rotated frame the boxes were detected in, truncated to whole pixels
+    x = np.trunc(unrotate_x(np.asarray(gazePoint.x, dtype=float), rotate_amount, frame_width))
+    y = np.trunc(np.asarray(gazePoint.y, dtype=float))
+    inside = points_in_boxes(np.stack((x, y), axis=1), [box["box"] for box in boundingBoxes], frame_width)
+
+    #one update per gaze point inside each box, in box order
+    for box, hits in zip(boundingBoxes, inside.sum(axis=0)):
+        for _ in range(hits):
+            graph.update(gazePoint.time, str(box["id"]))
                     
                     
-def calculate_overlap(box1, box2, screen_width, overlap_margin=50, percentage=None):
-    """
-    Calculate the overlapping area between two boxes, considering horizontal screen wrap-around.
-
-    Parameters:
-    box1, box2: Dict with "box" as Tuple of (x, y, w, h)
-        x, y: Coordinates of the top-left corner of the box.
-        w, h: Width and height of the box.
-    screen_width: int
-        The width of the screen.
-    overlap_margin: int
-        The margin of overlap to consider at the screen edges.
-    percentage: float, optional
-        The minimum percentage of overlap required to consider as valid.
-
-    Returns:
-    overlap_area: float
-        The area of overlap between the two boxes, or -1 if no valid overlap.
-    """
-    # Unpack the boxes
-    x1, y1, w1, h1 = box1["box"]
-    x2, y2, w2, h2 = box2["box"]
-
-    # Calculate the standard intersection
-    def get_overlap_area(x1, y1, w1, h1, x2, y2, w2, h2):
-        x_left = max(x1, x2)
-        y_top = max(y1, y2)
-        x_right = min(x1 + w1, x2 + w2)
-        y_bottom = min(y1 + h1, y2 + h2)
-        
-        if x_right < x_left or y_bottom < y_top:
-            return 0  # No overlap
-        
-        overlap_width = x_right - x_left
-        overlap_height = y_bottom - y_top
-        return overlap_width * overlap_height
-
-    # Standard overlap area
-    overlap_area = get_overlap_area(x1, y1, w1, h1, x2, y2, w2, h2)
-
-    # Check for overlap across screen edges (horizontal)
-    if x1 < overlap_margin:
-        # Overlapping on the left side, check the right side wrap-around
-        overlap_area = max(overlap_area, get_overlap_area(x1 + screen_width, y1, w1, h1, x2, y2, w2, h2))
-    elif x1 + w1 > screen_width - overlap_margin:
-        # Overlapping on the right side, check the left side wrap-around
-        overlap_area = max(overlap_area, get_overlap_area(x1 - screen_width, y1, w1, h1, x2, y2, w2, h2))
-
-    if overlap_area == 0:
-        return -1
-
-    # Ensure the overlap is greater than the largest overlap tracked
-    if box2["largestOverlap"] > overlap_area:
-        return -1
-
-    # Calculate areas for percentage-based check
-    area1 = w1 * h1
-    area2 = w2 * h2
-
-    decay_factor = 0.6
-    if percentage is not None:
-        decay_factor = percentage
-
-    # Check if the overlap area is less than the decay factor of either box's area
-    if overlap_area < decay_factor * area1 and overlap_area < decay_factor * area2:
-        return -1  # Overlap is less than the required percentage
-    
-    subtract_decay = 0
-    
-    if box1["decay"] > 3:
-        subtract_decay = 700 * box1["decay"]
-    return overlap_area - subtract_decay
-
-
-
 def draw_box(frame, box, frame_width=1, rotation=0, add_one=False, thickness=3, color=(0,255,0)):
     x, y, w, h = box["box"]
-    x = int((x - rotation) % frame_width)
+    x = int(unrotate_x(x, rotation, frame_width))
     y = int(y)
     w = int(w)
     h = int(h)
     cv2.rectangle(frame, (x,y), (x+w, y+h), color, thickness)
+    if x + w > frame_width > 1:
+        # The box crosses the seam, draw the part that continues at the left edge too
+        cv2.rectangle(frame, (x-frame_width,y), (x+w-frame_width, y+h), color, thickness)
     id_ = str(box["id"])
     if add_one:
         id_ = str(box["id"] + 1)
@@ -357,34 +854,6 @@ def convert_to_xywh(bbox_array):
     return [x, y, w, h]
 
 
-
-def calculate_wrapped_distance(box1, box2, screen_width):
-    """
-    Calculate the wrapped Euclidean distance between two boxes, allowing for wrap-around at screen edges.
-
-    Parameters:
-    box1, box2: dict
-        Dictionaries containing bounding box information, including center coordinates.
-    screen_width: int
-        The width of the screen (in pixels) to handle wrap-around calculations.
-
-    Returns:
-    float
-        The Euclidean distance between the centers of the two boxes, accounting for screen wrap-around.
-    """
-    # Calculate Euclidean distance with screen wrapping in mind
-    center1_x, center1_y = box1["box"][0], box1["box"][1]
-    center2_x, center2_y = box2["box"][0], box2["box"][1]
-    
-    dx = abs(center1_x - center2_x)
-    dy = abs(center1_y - center2_y)
-    
-    # If the distance along the x-axis is greater than half the screen width, wrap around
-    if dx > screen_width / 2:
-        dx = screen_width - dx
-    
-    return np.sqrt(dx**2 + dy**2)
-
 def check_for_box_jumping_to_edges(box, box2, frame_left_margin, frame_right_margin, frame_width):
     if box["box"][0] < frame_left_margin and box2["box"][0] < frame_width / 2:
         return False
@@ -394,154 +863,318 @@ def check_for_box_jumping_to_edges(box, box2, frame_left_margin, frame_right_mar
 
 
 
-def reID(input_path, results, rotate_amount, progress=None):
-    box_with_ID = {
-        "box": [],
-        "id": -1,
-        "decay": 0,
-        "largestOverlap": 0
-    }
-    list_of_frames = []
-    num_of_people = 0
-    for result in results:
-        list_of_boxes_with_ID = []
-        for box in result:
-            box_with_ID["box"] = convert_to_xywh(box.data.cpu().numpy()[0])
-            list_of_boxes_with_ID.append(copy.deepcopy(box_with_ID))
-            box_with_ID = {
-                "box": [],
-                "id": -1,
-                "decay": 0,
-                "largestOverlap": 0
-            }
-        list_of_frames.append(list_of_boxes_with_ID)
-        
-        if len(list_of_boxes_with_ID) > num_of_people:
-            num_of_people = len(list_of_boxes_with_ID)
-            longest_list_of_boxes_with_ID = list_of_boxes_with_ID
-    unique_output_folder = os.path.dirname(input_path)
-    folder_name = os.path.basename(unique_output_folder) 
-    cap = cv2.VideoCapture(input_path)
+def boxes_with_ids(results):
+    """
+    Per-frame structured arrays of untracked boxes for reID, plus the most people seen in one frame.
 
-    # Get video properties
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    Every box starts with id -1, decay 0 and largestOverlap 0 (see utils.trackState).
+    """
+    results = as_detection_store(results)
+    list_of_frames = [frame_boxes(results.boxes(frame_index)) for frame_index in range(len(results))]
+    num_of_people = max((len(frame) for frame in list_of_frames), default=0)
+    return list_of_frames, num_of_people
+
+
+def initial_tracks(list_of_frames):
+    """Start one track per box of the second frame, the way reID always has. Returns (tracks, next id)."""
+    list_of_frames[1]["id"] = np.arange(len(list_of_frames[1]))
+    current_boxes = Tracks(list_of_frames[1])
+    return current_boxes, len(current_boxes)
+
+
+def assign_greedy(frame, current_boxes, id_for_box, num_of_people, frame_width):
+    """
+    Give the boxes of one frame track ids the way reID originally did, returns the next free id.
+
+    Tracks take turns claiming the boxes they overlap most, so a later track can
+    take a box from an earlier one. Boxes left over go to the nearest unmatched
+    track or start a new one, one box after the other.
+    """
     frame_left_margin = frame_width / 14
     frame_right_margin = frame_width * 13 / 14
-    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))  # Total frames for progress tracking
+    # The overlap of every track with every box at once: the areas, and whether they
+    # reach 10% of either box, do not change while the tracks take turns.
+    # In float32 like the YOLO boxes reID used to work on, so largestOverlap comes out the same
+    track_boxes = current_boxes.boxes["box"].astype(np.float32)
+    boxes = frame["box"].astype(np.float32)
+    areas = overlap_areas(track_boxes, boxes, frame_width, dtype=np.float32)
+    large_enough = (areas > 0) & ~((areas < 0.1 * (track_boxes[:, 2] * track_boxes[:, 3])[:, None])
+                                  & (areas < 0.1 * (boxes[:, 2] * boxes[:, 3])[None, :]))
+    # A view, so the overlaps written into the frame below count for the tracks after
+    largest_overlaps = frame["largestOverlap"]
+    current_boxes.boxes["decay"] += 1
+    for t, box in enumerate(current_boxes):
+        if box["box"][0] < frame_left_margin or (box["box"][0]) > frame_width * 13 / 14:
+            continue
+        subtract_decay = 700 * int(box["decay"]) if box["decay"] > 3 else 0
+        overlaps = np.where(large_enough[t] & (largest_overlaps <= areas[t]), areas[t] - subtract_decay, -1)
+        # Each box whose overlap beats every overlap before it takes this track's id
+        max_overlaps = np.maximum.accumulate(np.concatenate(([-1.0], overlaps)))[:-1]
+        for j in np.flatnonzero(overlaps > max_overlaps):
+            frame[j]["id"] = box["id"]
+            frame[j]["largestOverlap"] = overlaps[j]
+            frame[j]["decay"] = 0
+
+    # for k, box in enumerate(current_boxes):
+    #     max_overlap = -1
+    #     index = 0
+    #     for j, box2 in enumerate(frame):
+    #         if box2["id"] == -1 and (all(box["id"] != other_box["id"] for other_box in frame if other_box is not box)):
+    #             if box["box"][0] < frame_left_margin or (box["box"][0]) > frame_right_margin:
+    #                 continue
+    #             overlap = calculate_overlap(box, box2, frame_width, percentage=0.1)
+    #             if overlap > max_overlap:
+    #                 max_overlap = overlap
+    #                 index = j
+    #                 frame[j]["id"] = box["id"]
+    #                 frame[j]["largestOverlap"] = max_overlap
+    #                 frame[j]["decay"] = 0
+
+    for box in frame:
+        if box["id"] != -1:
+            current_boxes[box["id"]] = box
+
+    for box in frame:
+        if box["id"] == -1:
+            min_distance = float('inf')
+            closest_box_index = None
+            tracks = current_boxes.boxes
+            on_edge = (tracks["box"][:, 0] < frame_left_margin) | (tracks["box"][:, 0] > frame_right_margin)
+            candidates = (tracks["decay"] != 0) | on_edge
+            if candidates.any():
+                distances = center_distances([box["box"]], tracks["box"], frame_width)[0] - np.where(on_edge, 100, 0)
+                distances[~candidates] = np.inf
+                closest_box_index = int(np.argmin(distances))
+                min_distance = float(distances[closest_box_index])
+            if closest_box_index is not None and min_distance < 200 and check_for_box_jumping_to_edges(box, current_boxes[closest_box_index], frame_left_margin, frame_right_margin, frame_width):
+                box["id"] = current_boxes[closest_box_index]["id"]
+                box["largestOverlap"] = 0
+                box["decay"] = 0
+                current_boxes[closest_box_index] = box
+            elif box["box"][0] < frame_left_margin or (box["box"][0]) > frame_right_margin:
+                continue
+            elif len(current_boxes) <= num_of_people:
+                box["id"] = id_for_box
+                current_boxes.append(box)
+                id_for_box += 1
+    return id_for_box
+
+
+def assign_optimal(frame, current_boxes, id_for_box, num_of_people, frame_width, max_component=64):
+    """
+    Give the boxes of one frame track ids with one minimum-cost assignment, returns the next free id.
 
-    # Define the codec and create VideoWriter object
+    Overlap and distance matches are gated as in assign_greedy and solved together
+    (see utils.assignment.track_costs), so no track takes a box another track
+    needs more. Unmatched boxes away from the seam margins start new tracks while
+    there are no more tracks than the most people seen in one frame.
+    """
+    frame_left_margin = frame_width / 14
+    frame_right_margin = frame_width * 13 / 14
+    tracks = current_boxes.boxes
+    tracks["decay"] += 1
+    cost, feasible, overlap = track_costs(tracks["box"], tracks["decay"], frame["box"], frame_width,
+                                          frame_left_margin, frame_right_margin)
+    for t, j in assign(cost, feasible, max_component):
+        frame[j]["id"] = tracks[t]["id"]
+        frame[j]["largestOverlap"] = overlap[t, j]
+        frame[j]["decay"] = 0
+    for box in frame:
+        if box["id"] != -1:
+            current_boxes[box["id"]] = box
+        elif box["box"][0] < frame_left_margin or box["box"][0] > frame_right_margin:
+            continue
+        elif len(current_boxes) <= num_of_people:
+            box["id"] = id_for_box
+            current_boxes.append(box)
+            id_for_box += 1
+    return id_for_box
+
+
+class OnlineTracker:
+    """
+    reID one frame at a time, so tracking can keep up with detection.
+
+    update(boxes) takes the (N, 4) x, y, w, h boxes of the next frame and returns
+    the tracked boxes of the frame before it, a structured array with every
+    track's last box and ids starting at 1 (see utils.trackState), or None for the
+    first frame. Tracking runs one frame behind because the tracks are started
+    from the second frame, which is also why the last frame of a video never
+    appears in the output. max_people caps the number of tracks; when None it is
+    the most boxes seen in one frame so far. tracks and next_id continue from an
+    earlier tracker state. engine "overlap" matches boxes by overlap and decay,
+    with assignment picking assign_optimal or assign_greedy, while "kalman"
+    follows every track with a motion model (see KalmanTracker).
+    """
 
-    id_for_box = 0
-    current_boxes = []
+    def __init__(self, frame_width, max_people=None, assignment="optimal", tracks=None, next_id=0, engine="overlap"):
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"Unknown assignment '{assignment}', expected one of {ASSIGNMENT_MODES}")
+        if engine not in TRACKER_ENGINES:
+            raise ValueError(f"Unknown tracker engine '{engine}', expected one of {TRACKER_ENGINES}")
+        self.frame_width = frame_width
+        self.max_people = max_people
+        self.assign = assign_greedy if assignment == "greedy" else assign_optimal
+        self.kalman = KalmanTracker(frame_width) if engine == "kalman" else None
+        self.tracks = tracks
+        self.next_id = next_id
+        self.most_people = 0
+        self.frames = 0
+        self.pending = None
+
+    @property
+    def num_of_people(self):
+        return self.max_people if self.max_people is not None else self.most_people
+
+    def update(self, boxes):
+        frame = boxes if getattr(boxes, "dtype", None) == BOX_DTYPE else frame_boxes(boxes)
+        self.frames += 1
+        self.most_people = max(self.most_people, len(frame))
+        previous, self.pending = self.pending, frame
+        if previous is None:
+            return None
+        if self.tracks is None:
+            self.tracks, self.next_id = initial_tracks([previous, frame])
+        if self.kalman is None:
+            self.next_id = self.assign(previous, self.tracks, self.next_id, self.num_of_people, self.frame_width)
+            return self.tracks.snapshot()
+        if len(self.kalman) < len(self.tracks):
+            # New or resumed tracks without a filter start one at rest on their last box
+            self.kalman.initiate(self.tracks.boxes["box"][len(self.kalman):])
+        self.next_id = self.kalman.step(previous, self.tracks, self.next_id, self.num_of_people)
+        return self.tracks.snapshot()
+
+    def filter_state(self):
+        """State of the motion model for a checkpoint, None for the overlap engine."""
+        return None if self.kalman is None else self.kalman.state()
+
+
+def feed_tracker(tracker, results):
+    """Hand the frames of results the tracker has not seen yet to it, collecting its output in results.tracks."""
+    if tracker is None:
+        return results
+    if results.tracks is None:
+        results.tracks = []
+    for index in range(tracker.frames, len(results)):
+        tracked = tracker.update(results.boxes(index))
+        if tracked is not None:
+            results.tracks.append(tracked)
+    return results
+
+
+def track_frames(list_of_frames, current_boxes, id_for_box, num_of_people, frame_width, progress=None, num_frames=None,
+                 assignment="optimal", engine="overlap"):
+    """
+    Assign track ids to the boxes of every frame but the last one.
+
+    list_of_frames may be any iterable of frames (structured arrays or (N, 4)
+    boxes), num_frames is then needed for the progress. current_boxes is the Tracks table of the last box of every track so
+    far, or None to start the tracks from the second frame, and is updated in
+    place; new tracks get ids from id_for_box on. Returns the frames of the output
+    JSON as structured arrays (every track's last box, ids starting at 1, see
+    utils.trackState.frames_to_json) and the next free id. Progress is emitted
+    from 70% to 100% over num_frames frames.
+    """
+    tracker = OnlineTracker(frame_width, num_of_people, assignment, current_boxes, id_for_box, engine)
+    if num_frames is None:
+        num_frames = len(list_of_frames)
     boxes_for_gaze = []
 
-    for box in list_of_frames[1]:
-        box["id"] = id_for_box
-        current_boxes.append(copy.deepcopy(box))
-        id_for_box += 1
-
     # Progress initialization: we will emit updates from 70% to 100%
     initial_progress = 70
     progress_range = 30
-    frames_processed = 0
 
-    while cap.isOpened():
-        for i, frame in enumerate(list_of_frames):
-            print(i)
-            if i == len(list_of_frames) - 1:
-                break
+    for frame in list_of_frames:
+        tracked = tracker.update(frame)
+        if tracked is None:
+            continue
+        boxes_for_gaze.append(tracked)
+
+        # Update progress during each frame processing
+        if progress is not None:
+            progress_percentage = initial_progress + int((len(boxes_for_gaze) / num_frames) * progress_range)
+            progress.emit(progress_percentage)
+    return boxes_for_gaze, tracker.next_id
 
-            # Read the frame from the video
 
-            # Update progress during each frame processing
-            frames_processed += 1
+def track_in_chunks(results, boxes_for_gaze, tracker, checkpoint, progress=None, cancel=None):
+    """
+    Continue tracking the frames of results after those already in boxes_for_gaze, one checkpoint chunk at a time.
+
+    Gives the same ids as tracking in one go, since the tracker state between
+    frames is only its tracks and next id. Every chunk is appended to the
+    checkpoint together with that state, and cancel is polled in between.
+    """
+    last_frame = len(results) - 1  # the last frame is never tracked
+    chunk = []
+    for index in range(len(boxes_for_gaze), len(results)):
+        tracked = tracker.update(results.boxes(index))
+        if tracked is not None:
+            chunk.append(tracked)
+        if len(chunk) == checkpoint.chunk_size or (chunk and index == last_frame):
+            chunk = frames_to_json(chunk)
+            boxes_for_gaze.extend(chunk)
+            checkpoint.append_tracks(chunk, tracker.tracks.to_json(), tracker.next_id, tracker.filter_state())
+            chunk = []
             if progress is not None:
-                progress_percentage = initial_progress + int((frames_processed / num_frames) * progress_range)
-                progress.emit(progress_percentage)
+                progress.emit(70 + int(len(boxes_for_gaze) / last_frame * 30))
+            if cancel is not None and cancel():
+                raise RunCancelled(f"Tracking cancelled after {len(boxes_for_gaze)} frames")
+    return boxes_for_gaze
 
-            for box in current_boxes:
-                box["decay"] += 1
-                max_overlap = -1
-                index = 0
-                for j, box2 in enumerate(frame):
-                    if box["box"][0] < frame_left_margin or (box["box"][0]) > frame_width * 13 / 14:
-                        continue
-                    overlap = calculate_overlap(box, box2, frame_width, percentage=0.1)
-                    if overlap > max_overlap:
-                        max_overlap = overlap
-                        index = j
-                        list_of_frames[i][j]["id"] = box["id"]
-                        list_of_frames[i][j]["largestOverlap"] = max_overlap
-                        list_of_frames[i][j]["decay"] = 0
-
-            # for k, box in enumerate(current_boxes):
-            #     max_overlap = -1
-            #     index = 0
-            #     for j, box2 in enumerate(frame):
-            #         if box2["id"] == -1 and (all(box["id"] != other_box["id"] for other_box in list_of_frames[i] if other_box is not box)):
-            #             if box["box"][0] < frame_left_margin or (box["box"][0]) > frame_right_margin:
-            #                 continue
-            #             overlap = calculate_overlap(box, box2, frame_width, percentage=0.1)
-            #             if overlap > max_overlap:
-            #                 max_overlap = overlap
-            #                 index = j
-            #                 list_of_frames[i][j]["id"] = box["id"]
-            #                 list_of_frames[i][j]["largestOverlap"] = max_overlap
-            #                 list_of_frames[i][j]["decay"] = 0
-
-            for box in frame:
-                if box["id"] != -1:
-                    current_boxes[box["id"]] = copy.deepcopy(box)
-
-            for box in frame:
-                if box["id"] == -1:
-                    min_distance = float('inf')
-                    closest_box_index = None
-                    cx1, cy1 = box["box"][0] + box["box"][2] / 2, box["box"][1] + box["box"][3] / 2
-                    for idx, curr_box in enumerate(current_boxes):
-                        if curr_box["decay"] != 0 or curr_box["box"][0] < frame_left_margin or (curr_box["box"][0]) > frame_right_margin:
-                            cx2, cy2 = curr_box["box"][0] + curr_box["box"][2] / 2, curr_box["box"][1] + curr_box["box"][3] / 2
-                            dx = abs(cx2 - cx1)
-                            dx = min(dx, frame_width - dx)
-                            dy = abs(cy2 - cy1)
-                            distance = np.sqrt(dx ** 2 + dy ** 2)
-                            if curr_box["box"][0] < frame_left_margin or (curr_box["box"][0]) > frame_right_margin:
-                                distance -= 100
-                            if distance < min_distance:
-                                min_distance = distance
-                                closest_box_index = idx
-                    if closest_box_index is not None and min_distance < 200 and check_for_box_jumping_to_edges(box, current_boxes[closest_box_index], frame_left_margin, frame_right_margin, frame_width):
-                        box["id"] = current_boxes[closest_box_index]["id"]
-                        box["largestOverlap"] = 0
-                        box["decay"] = 0
-                        current_boxes[closest_box_index] = copy.deepcopy(box)
-                    elif box["box"][0] < frame_left_margin or (box["box"][0]) > frame_right_margin:
-                        continue
-                    elif len(current_boxes) <= num_of_people:
-                        box["id"] = id_for_box
-                        current_boxes.append(box)
-                        id_for_box += 1
-            current_box_frame = []
-            for box in current_boxes:
-                append_box = copy.deepcopy(box)
-                append_box["id"] += 1
-                current_box_frame.append(append_box)
-
-            boxes_for_gaze.append(current_box_frame)
 
+def reID(input_path, results, rotate_amount, progress=None, source_video=None, cancel=None, assignment="optimal",
+         tracker_engine="overlap"):
+    results = as_detection_store(results)
+    unique_output_folder = os.path.dirname(input_path)
+    folder_name = os.path.basename(unique_output_folder) 
+    frame_width = results.frame_width
+    if frame_width is None:
+        # Plain per-frame results do not know the frame size, read it from the rotated
+        # video if run_detection saved it, otherwise from the (identical) source video
+        cap = cv2.VideoCapture(source_video if not os.path.exists(input_path) and source_video is not None else input_path)
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         cap.release()
 
+    # Detections from a checkpointed run_detection are tracked in checkpointed chunks too
+    checkpoint = RunCheckpoint(results.run_dir) if results.run_dir else None
+    if results.tracks is not None and len(results.tracks) == max(len(results) - 1, 0):
+        # Already tracked while detecting (run_detection with online_tracking)
+        boxes_for_gaze = results.tracks
+    elif checkpoint is not None:
+        tracker = OnlineTracker(frame_width, results.most_boxes, assignment, engine=tracker_engine)
+        boxes_for_gaze = []
+        if checkpoint.tracker_state is not None:
+            print(f"Resuming tracking after {checkpoint.tracked_frames} already tracked frames")
+            boxes_for_gaze = checkpoint.load_tracks()
+            current_boxes, tracker.next_id = checkpoint.tracker_state
+            tracker.tracks = Tracks.from_json(current_boxes)
+            if tracker.kalman is not None and checkpoint.filter_state is not None:
+                tracker.kalman.restore(checkpoint.filter_state)
+        try:
+            boxes_for_gaze = track_in_chunks(results, boxes_for_gaze, tracker, checkpoint, progress, cancel)
+        except RunCancelled:
+            # Leave the name free for the rerun, so the resumed JSON is named like an uninterrupted one
+            shutil.rmtree(unique_output_folder, ignore_errors=True)
+            raise
+    else:
+        # Frames are read straight from the detection store, one at a time
+        frames = (results.boxes(index) for index in range(len(results)))
+        boxes_for_gaze, _ = track_frames(frames, None, 0, results.most_boxes, frame_width, progress, len(results),
+                                         assignment, tracker_engine)
 
     dump_boxes_with_rotate = {
-        "boxes": boxes_for_gaze,
+        "boxes": frames_to_json(boxes_for_gaze),
         "rotate_amount": rotate_amount
     }
+    if results.metadata:
+        dump_boxes_with_rotate["metadata"] = results.metadata
     dump_boxes_with_rotate = convert_to_serializable(dump_boxes_with_rotate)
 
     with open(f"bounding_boxes_{folder_name}.json", 'w') as file:
         json.dump(dump_boxes_with_rotate, file, indent=4)
+    if checkpoint is not None:
+        checkpoint.remove()
         
     if os.path.exists(unique_output_folder):
         shutil.rmtree(unique_output_folder)
@@ -549,6 +1182,85 @@ def reID(input_path, results, rotate_amount, progress=None):
     return f"bounding_boxes_{folder_name}.json", f"results_{folder_name}.mp4"
 
 
+def redetect_range(video, json_path, start, end, progress=None, batch_size=1, weights="yolov8x.pt", imgsz=1920,
+                   conf=0.5, iou=0.4, backend="torch", video_reader="opencv", decode_width=None, decode_threads=0,
+                   assignment="optimal", tracker_engine="overlap", **detect_options):
+    """
+    Re-detect and re-track frames [start, end] of an existing bounding box JSON and splice them back in.
+
+    start and end are frame numbers of the box file (video frame FIRST_FRAME + n).
+    The frames are rotated by the file's rotate_amount and detected with the given
+    settings, detect_options go to detect_frames (e.g. tiled or roi_band), and the
+    video is decoded as in run_detection (video_reader, decode_width, decode_threads).
+    Tracking (assignment and tracker_engine as in reID) resumes from the tracks
+    stored at frame start - 1, so ids carry over into the range, and new tracks
+    take ids after the largest one in the file (see resume_tracks). Frames outside
+    the range are copied unchanged and the patch is recorded in
+    metadata["patches"]. Returns json_path.
+    """
+    with open(json_path, 'r') as file:
+        data = json.load(file)
+    boxes_for_gaze = data.get("boxes", [])
+    rotate_amount = data.get("rotate_amount", 0)
+    if not 0 <= start <= end < len(boxes_for_gaze):
+        raise ValueError(f"Frame range [{start}, {end}] is outside the {len(boxes_for_gaze)} frames of {json_path}")
+
+    device = default_device() if backend == "torch" else 'cpu'
+    predict_kwargs = dict(classes=[0], conf=conf, iou=iou, device=device, imgsz=imgsz)
+    model = get_model(weights, device, imgsz, backend)
+    cap = open_video(video, video_reader, decode_width, decode_threads)
+    frame_width = cap.source_width
+    cap.set(cv2.CAP_PROP_POS_FRAMES, FIRST_FRAME + start)
+    ret, first_frame = cap.read()
+    if not ret:
+        cap.release()
+        raise ValueError(f"Failed to read frame {FIRST_FRAME + start} of {video}")
+
+    # One frame past the range, tracking leaves the last frame it is given out of the output
+    num_frames = end - start + 2
+    geometry = DecodedGeometry(cap, rotate_amount)
+    frames = iter_rotated_frames(cap, geometry.rotate_amount, first_frame, num_frames)
+    detect_options = dict(detect_options, roi_band=geometry.band(detect_options.get("roi_band")))
+    results = DetectionStore(frame_width=frame_width)
+    for i, boxes in enumerate(detect_frames(model, frames, geometry.width, predict_kwargs, batch_size=batch_size,
+                                            **detect_options)):
+        results.append(geometry.to_source(detections_to_array(boxes)))
+        if progress is not None:
+            progress.emit(int((i + 1) / num_frames * 70))
+    cap.release()
+
+    list_of_frames, num_of_people = boxes_with_ids(results)
+    gap_ids = []
+    if start == 0:
+        current_boxes, id_for_box = initial_tracks(list_of_frames)
+    else:
+        current_boxes, id_for_box, gap_ids = resume_tracks(boxes_for_gaze, start)
+    num_of_people = max(num_of_people, len(current_boxes))
+    patched, _ = track_frames(list_of_frames, current_boxes, id_for_box, num_of_people, frame_width, progress,
+                              assignment=assignment, engine=tracker_engine)
+    patched = [frame[~np.isin(frame["id"], gap_ids)] for frame in patched]
+
+    boxes_for_gaze[start:start + len(patched)] = frames_to_json(patched)
+    data["boxes"] = boxes_for_gaze
+    data.setdefault("metadata", {}).setdefault("patches", []).append({
+        "frames": [start, start + len(patched) - 1],
+        "weights": weights,
+        "imgsz": imgsz,
+        "conf": conf,
+        "iou": iou,
+        "backend": backend,
+        **{key: value for key, value in detect_options.items() if value is not None},
+    })
+    data = convert_to_serializable(data)
+    # Write next to the original and swap it in, so a failed write never loses the file
+    temp_path = json_path + ".tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(temp_path, json_path)
+    print(f"Re-detected frames {start}-{start + len(patched) - 1} of {json_path}")
+    return json_path
+
+
 def convert_to_serializable(data):
     """Convert non-serializable objects (e.g., NumPy arrays, float32) into JSON-serializable types."""
     if isinstance(data, np.ndarray):
@@ -662,7 +1374,7 @@ def draw_boxes_from_pkl(json_path, video_path, add_one=False):
     # Open the input video
     cap = cv2.VideoCapture(video_path)
     #remove this is you want the whole video    
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 120)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, FIRST_FRAME)
     # Get video properties
     fps = int(cap.get(cv2.CAP_PROP_FPS))
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -672,7 +1384,7 @@ def draw_boxes_from_pkl(json_path, video_path, add_one=False):
     # Initialize the video writer for the output video
     out = cv2.VideoWriter(f"{os.path.splitext(video_path)[0]}_annotated{os.path.splitext(video_path)[1]}", fourcc, fps, (frame_width, frame_height))
     while cap.isOpened():
-        for frame_number, frame_boxes in enumerate(boxes_for_gaze):
+        for frame_number, boxes_in_frame in enumerate(boxes_for_gaze):
             print("this is progressing", frame_number)
             ret, frame = cap.read()
             if not ret:
@@ -681,7 +1393,7 @@ def draw_boxes_from_pkl(json_path, video_path, add_one=False):
     # Draw the bounding boxes for the current frame
             cv2.putText(frame, str(frame_number), (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36, 255, 12), 2)
 
-            for box in frame_boxes:
+            for box in boxes_in_frame:
                 draw_box(frame, box, frame_width, rotation, add_one=add_one)
 
     # Write the processed frame to the output video
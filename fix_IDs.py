@@ -1,3 +1,4 @@
+import os
 import json
 import argparse
 from GazeXR import convert_to_serializable
@@ -51,15 +52,19 @@ def load_bboxes(file_path):
     return boxes_for_gaze, rotation
 
 def save_bboxes(file_path, boxes_for_gaze, rotate_amount=0):
-    """Save bounding boxes to a JSON file."""
-    dump_boxes_with_rotate = {
-        "boxes": boxes_for_gaze,
-        "rotate_amount": rotate_amount
-    }
+    """Save bounding boxes to a JSON file, keeping its other keys such as metadata."""
+    dump_boxes_with_rotate = {}
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as file:
+            dump_boxes_with_rotate = json.load(file)
+    dump_boxes_with_rotate["boxes"] = boxes_for_gaze
+    dump_boxes_with_rotate["rotate_amount"] = rotate_amount
     dump_boxes_with_rotate = convert_to_serializable(dump_boxes_with_rotate)
-    with open(file_path, 'w') as file:
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w') as file:
         json.dump(dump_boxes_with_rotate, file, indent=4)
-        
+    os.replace(temp_path, file_path)
+
 def main():
     # Load the JSON file
     json_file = "bounding_boxes_rotated_Molnar_M_Amb_Clip2_logo.json"
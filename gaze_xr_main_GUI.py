@@ -26,6 +26,9 @@ from GazeXR import (
 from PyQt6.QtCore import QThread, pyqtSignal
 from generateGraphFunctions import (generate_graph_popup, generate_IDs, generate_bounding_boxes, help_box)
 from video_annotator import VideoAnnotator
+from utils.detectorBackends import DETECTOR_BACKENDS
+from utils.kalmanTracker import TRACKER_ENGINES
+from utils.runCheckpoint import RunCancelled
 import os
 class Worker(QThread):
     progress = pyqtSignal(int)  # Signal to emit progress updates
@@ -39,6 +42,7 @@ class Worker(QThread):
         self.args = args  # Positional arguments for the task
         self.kwargs = kwargs  # Keyword arguments for the task
         self.paused = False  # Flag to handle the pause state
+        self.cancelled = False  # Set by cancel(), polled by the detection and tracking loops
         self._pause_condition = QWaitCondition()  # Condition for pausing
         self._mutex = QMutex()  # Mutex for thread safety
 
@@ -61,6 +65,26 @@ class Worker(QThread):
         self._pause_condition.wakeAll()
         self._mutex.unlock()
 
+    def cancel(self):
+        """Ask the task to stop, detection and tracking keep their completed chunks for a rerun to resume from."""
+        self._mutex.lock()
+        self.cancelled = True
+        self.paused = False
+        self._pause_condition.wakeAll()
+        self._mutex.unlock()
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def wait_for_video(self):
+        """Block until the annotator window is closed, raising RunCancelled if the task was cancelled meanwhile."""
+        self._mutex.lock()
+        if not self.cancelled:
+            self._pause_condition.wait(self._mutex)
+        self._mutex.unlock()
+        if self.cancelled:
+            raise RunCancelled("Task cancelled while the annotated video was open")
+
     def check_pause(self):
         """Method to periodically check if the thread is paused and wait if it is."""
         self._mutex.lock()
@@ -477,6 +501,31 @@ class Ui_MainWindow(object):
         self.clear_queue_button.setEnabled(False)
         self.clear_queue_button.clicked.connect(self.clear_queue)
         self.verticalLayout.addWidget(self.clear_queue_button)
+
+        self.cancel_task_button = QtWidgets.QPushButton(parent=self.centralwidget)
+        self.cancel_task_button.setMaximumSize(QtCore.QSize(171, 16777215))
+        self.cancel_task_button.setStyleSheet(self.clear_queue_button.styleSheet())
+        self.cancel_task_button.setObjectName("cancel_task_button")
+        self.cancel_task_button.setText("Cancel Task")
+        self.cancel_task_button.setToolTip("Stop the running task, adding the same video again resumes where it stopped")
+        self.cancel_task_button.clicked.connect(self.cancel_task)
+        self.verticalLayout.addWidget(self.cancel_task_button)
+
+        self.backend_box = QtWidgets.QComboBox(parent=self.centralwidget)
+        self.backend_box.setMaximumSize(QtCore.QSize(171, 16777215))
+        self.backend_box.setStyleSheet("color: #fff; background-color: #222;")
+        self.backend_box.setObjectName("backend_box")
+        self.backend_box.setToolTip("Detector backend, onnx and openvino are faster on machines without a GPU")
+        self.backend_box.addItems(DETECTOR_BACKENDS)
+        self.verticalLayout.addWidget(self.backend_box)
+
+        self.tracker_box = QtWidgets.QComboBox(parent=self.centralwidget)
+        self.tracker_box.setMaximumSize(QtCore.QSize(171, 16777215))
+        self.tracker_box.setStyleSheet(self.backend_box.styleSheet())
+        self.tracker_box.setObjectName("tracker_box")
+        self.tracker_box.setToolTip("Tracker, kalman follows people by their motion and keeps ids through short occlusions")
+        self.tracker_box.addItems(TRACKER_ENGINES)
+        self.verticalLayout.addWidget(self.tracker_box)
         
 
         self.gridLayout.addLayout(self.verticalLayout, 1, 1, 1, 1)
@@ -567,6 +616,8 @@ class Ui_MainWindow(object):
                 "gaze_path": self.gaze_path,
                 "button": self.button, 
                 "id": id_,
+                "backend": self.backend_box.currentText(),
+                "tracker_engine": self.tracker_box.currentText(),
             }
         self.json_path = ''
         self.video_path = ''
@@ -600,12 +651,12 @@ class Ui_MainWindow(object):
         self.progress_container.addWidget(task_widget)
     
         if queue_item["button"] == "generate_graph":
-                self.start_graph_task(queue_item["json_path"], queue_item["video_path"], queue_item["gaze_path"], progress_bar, task_label)
+                self.start_graph_task(queue_item["json_path"], queue_item["video_path"], queue_item["gaze_path"], progress_bar, task_label, queue_item["backend"], queue_item["tracker_engine"])
         elif queue_item["button"] == "extract_id":
                 id_, ok = QInputDialog.getInt(None, "Enter ID", "Please enter a number for the ID:")
-                self.start_id_extraction(queue_item["json_path"], queue_item["video_path"], queue_item["gaze_path"], queue_item["id_"], progress_bar, task_label)
+                self.start_id_extraction(queue_item["json_path"], queue_item["video_path"], queue_item["gaze_path"], queue_item["id_"], progress_bar, task_label, queue_item["backend"], queue_item["tracker_engine"])
         elif queue_item["button"] == "bounding_boxes":
-                self.start_bounding_task(queue_item["json_path"], queue_item["video_path"], progress_bar, task_label)
+                self.start_bounding_task(queue_item["json_path"], queue_item["video_path"], progress_bar, task_label, queue_item["backend"], queue_item["tracker_engine"])
                 
     def receive_data(self, data):
         """Receive data from the popup window and set the paths."""
@@ -620,48 +671,53 @@ class Ui_MainWindow(object):
         # Update the label with the received paths
 
 
-    def start_id_extraction(self, json_path, video_path, gaze_path, id_, progress_bar, task_label):
+    def start_id_extraction(self, json_path, video_path, gaze_path, id_, progress_bar, task_label, backend="torch", tracker_engine="overlap"):
         # Create the worker instance
-        self.worker = Worker(extract_function, json_path, video_path, gaze_path, id_)
+        self.worker = Worker(extract_function, json_path, video_path, gaze_path, id_, backend=backend, tracker_engine=tracker_engine)
 
         # Connect the worker signals to your methods
         self.worker.show_video.connect(self.show_video)
         self.worker.progress.connect(lambda value: self.update_progress(progress_bar, task_label, value))  # Pass the progress bar and label
         self.worker.finished.connect(lambda result: self.on_id_completed(progress_bar, task_label, result))  # Handle when the task is done
-        self.worker.error.connect(self.on_task_error)  # Handle errors
+        self.worker.error.connect(lambda message: self.on_task_error(progress_bar, task_label, message))  # Handle errors
 
         # Start the worker thread
         self.worker.start()
         
-    def start_bounding_task(self, json_path, video_path, progress_bar,task_label):
+    def start_bounding_task(self, json_path, video_path, progress_bar,task_label, backend="torch", tracker_engine="overlap"):
         # Create the worker instance
-        self.worker = Worker(bounding_function, json_path, video_path)
+        self.worker = Worker(bounding_function, json_path, video_path, backend=backend, tracker_engine=tracker_engine)
 
         # Connect the worker signals to your methods
         self.worker.show_video.connect(self.show_video)
         self.worker.progress.connect(lambda value: self.update_progress(progress_bar, task_label, value))  # Pass the progress bar and label
         self.worker.finished.connect(lambda result: self.on_id_completed(progress_bar, task_label, result))  # Handle when the task is done
-        self.worker.error.connect(self.on_task_error)  # Handle errors
+        self.worker.error.connect(lambda message: self.on_task_error(progress_bar, task_label, message))  # Handle errors
 
         # Start the worker thread
         self.worker.start()
         
         
-    def start_graph_task(self, json_path, video_path, gaze_path, progress_bar, task_label):
+    def start_graph_task(self, json_path, video_path, gaze_path, progress_bar, task_label, backend="torch", tracker_engine="overlap"):
         # Create the worker instance
-        self.worker = Worker(graph_function, json_path, video_path, gaze_path)
+        self.worker = Worker(graph_function, json_path, video_path, gaze_path, backend=backend, tracker_engine=tracker_engine)
 
         # Connect the worker signals to your methods
         self.worker.show_video.connect(self.show_video)
         self.worker.progress.connect(lambda value: self.update_progress(progress_bar, task_label, value))  # Pass the progress bar and label
         self.worker.finished.connect(lambda result: self.on_graph_completed(progress_bar, task_label, result))  # Handle when the task is done
-        self.worker.error.connect(self.on_graph_error)  # Handle errors
+        self.worker.error.connect(lambda message: self.on_graph_error(progress_bar, task_label, message))  # Handle errors
 
         # Start the worker thread
         self.worker.start()
 
     def on_id_completed(self, progress_bar, task_label, value):
         self.button = ''
+        self.finish_task(progress_bar)
+        # Update the UI with the result (e.g., show a message or display the graph)
+
+    def finish_task(self, progress_bar):
+        """Remove the task's progress bar and label and start the next queued task."""
         # Get the parent widget that contains both the progress bar and label
         task_widget = progress_bar.parentWidget()
         # Remove the widget from the layout
@@ -672,7 +728,6 @@ class Ui_MainWindow(object):
             self.start_task(self.queue.pop(0))
         else:
             self.clear_queue_button.setEnabled(False)
-        # Update the UI with the result (e.g., show a message or display the graph)
     def update_progress(self, progress_bar, task_label, value):
         """Update a progress bar based on progress emitted by the worker."""
         progress_bar.setProperty("value", value)
@@ -681,21 +736,19 @@ class Ui_MainWindow(object):
 
     def on_graph_completed(self, progress_bar, task_label, value):
         self.graph_image.setPixmap(QtGui.QPixmap(value))
-        task_widget = progress_bar.parentWidget()
-
-        # Remove the widget from the layout
-        self.progress_container.removeWidget(task_widget)
-        task_widget.deleteLater()  # Delete the widget (which contains the progress bar and label)
-
-        if self.queue != []:
-            self.start_task(self.queue.pop(0))
-        else:
-            self.clear_queue_button.setEnabled(False)
+        self.finish_task(progress_bar)
         # Update the UI with the result (e.g., show a message or display the graph)
 
-    def on_graph_error(self, error_message):
-        """Handle errors raised during the execution."""
+    def on_graph_error(self, progress_bar, task_label, error_message):
+        """Handle errors raised during the execution, a cancelled task also ends up here."""
+        print(f"Error: {error_message}")
+        self.finish_task(progress_bar)
+
+    def on_task_error(self, progress_bar, task_label, error_message):
+        """Handle errors raised during the execution, a cancelled task also ends up here."""
         print(f"Error: {error_message}")
+        self.button = ''
+        self.finish_task(progress_bar)
 
     def show_video(self, video_path, bbox_file_path):
         # Create and show your video window with the provided paths
@@ -708,16 +761,19 @@ class Ui_MainWindow(object):
     def clear_queue(self):
         self.queue = []
         self.clear_queue_button.setEnabled(False)
+
+    def cancel_task(self):
+        worker = getattr(self, "worker", None)
+        if worker is not None and worker.isRunning():
+            worker.cancel()
         
 
-def bounding_function(progress,show_video_signal, worker, json_path, video_path):
+def bounding_function(progress,show_video_signal, worker, json_path, video_path, backend="torch", tracker_engine="overlap"):
         if json_path == '':
-            output_path, results, rotate_amount = run_detection(video_path, progress)
-            json_file, processed_video_path = reID(output_path, results, rotate_amount, progress)
+            output_path, results, rotate_amount = run_detection(video_path, progress, backend=backend, cancel=worker.is_cancelled)
+            json_file, processed_video_path = reID(output_path, results, rotate_amount, progress, source_video=video_path, cancel=worker.is_cancelled, tracker_engine=tracker_engine)
             show_video_signal.emit(video_path, json_file)
-            worker._mutex.lock()
-            worker._pause_condition.wait(worker._mutex)
-            worker._mutex.unlock()
+            worker.wait_for_video()
         else:
             progress.emit(50)
             draw_boxes_from_pkl(json_path, video_path)
@@ -725,14 +781,12 @@ def bounding_function(progress,show_video_signal, worker, json_path, video_path)
             
         
 
-def extract_function(progress,show_video_signal, worker, json_path, video_path, gaze_path, id_):
+def extract_function(progress,show_video_signal, worker, json_path, video_path, gaze_path, id_, backend="torch", tracker_engine="overlap"):
         if json_path == '':
-            output_path, results, rotate_amount = run_detection(video_path, progress)
-            json_file, processed_video_path = reID(output_path, results, rotate_amount, progress)
+            output_path, results, rotate_amount = run_detection(video_path, progress, backend=backend, cancel=worker.is_cancelled)
+            json_file, processed_video_path = reID(output_path, results, rotate_amount, progress, source_video=video_path, cancel=worker.is_cancelled, tracker_engine=tracker_engine)
             show_video_signal.emit(video_path, json_file)
-            worker._mutex.lock()
-            worker._pause_condition.wait(worker._mutex)
-            worker._mutex.unlock()
+            worker.wait_for_video()
             plot = initialize_plot_data(json_file, gaze_path)
             generate_compilation_from_frames(processed_video_path, plot.data, id_, gaze_path)
         else:
@@ -742,14 +796,12 @@ def extract_function(progress,show_video_signal, worker, json_path, video_path,
             generate_compilation_from_frames(video_path, plot.data, id_, gaze_path)
             progress.emit(99)
         
-def graph_function(progress, show_video_signal,worker, json_path, video_path, gaze_path):
+def graph_function(progress, show_video_signal,worker, json_path, video_path, gaze_path, backend="torch", tracker_engine="overlap"):
         if json_path == '':
-                output_path, results, rotate_amount = run_detection(video_path, progress)
-                json_file, processed_video_path = reID(output_path, results, rotate_amount, progress)
+                output_path, results, rotate_amount = run_detection(video_path, progress, backend=backend, cancel=worker.is_cancelled)
+                json_file, processed_video_path = reID(output_path, results, rotate_amount, progress, source_video=video_path, cancel=worker.is_cancelled, tracker_engine=tracker_engine)
                 show_video_signal.emit(video_path, json_file)
-                worker._mutex.lock()
-                worker._pause_condition.wait(worker._mutex)
-                worker._mutex.unlock()
+                worker.wait_for_video()
                 plot = initialize_plot_data(json_file, gaze_path)
                 graph_path = generate_graph(plot, os.path.splitext(os.path.basename(video_path))[0])
                 return graph_path
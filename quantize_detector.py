@@ -0,0 +1,24 @@
+import argparse
+from utils.quantization import quantize_model, compare_quantized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create an INT8 person detector calibrated on our own videos and report how it compares to FP32.")
+    parser.add_argument("--weights", default="yolov8x.pt", help="FP32 detector weights to quantize")
+    parser.add_argument("--imgsz", type=int, default=1920, help="Inference size the quantized model is built for")
+    parser.add_argument("--calibration", nargs="+", required=True, help="Videos to sample calibration frames from")
+    parser.add_argument("--frames-per-video", type=int, default=100, help="Calibration frames sampled from each video")
+    parser.add_argument("--holdout", help="Held-out clip for the FP32 vs INT8 report")
+    parser.add_argument("--holdout-frames", type=int, default=100, help="Frames of the held-out clip used for the report")
+    parser.add_argument("--reference-backend", default="torch", help="Backend of the FP32 model in the report")
+
+    args = parser.parse_args()
+
+    quantize_model(args.weights, args.imgsz, args.calibration, args.frames_per_video)
+    if args.holdout:
+        compare_quantized(args.weights, args.imgsz, args.holdout, args.holdout_frames, reference_backend=args.reference_backend)
+    print("Use it with run_batch.py --backend int8 or the int8 backend in the GUI.")
+
+
+if __name__ == "__main__":
+    main()
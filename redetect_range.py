@@ -0,0 +1,36 @@
+import argparse
+from GazeXR import redetect_range
+from utils.detectorBackends import DETECTOR_BACKENDS
+from utils.videoReader import VIDEO_READERS
+from utils.assignment import ASSIGNMENT_MODES
+from utils.kalmanTracker import TRACKER_ENGINES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-detect and re-track a range of frames and patch them into an existing bounding box JSON.")
+    parser.add_argument("video", help="Path to the original video file")
+    parser.add_argument("json_path", help="bounding_boxes_*.json created from that video")
+    parser.add_argument("start", type=int, help="First frame of the range, numbered as in the JSON")
+    parser.add_argument("end", type=int, help="Last frame of the range (inclusive)")
+    parser.add_argument("--weights", default="yolov8x.pt", help="Detector weights to load")
+    parser.add_argument("--imgsz", type=int, default=1920, help="Detector input size in pixels")
+    parser.add_argument("--conf", type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument("--iou", type=float, default=0.4, help="Detection NMS IoU threshold")
+    parser.add_argument("--backend", choices=DETECTOR_BACKENDS, default="torch", help="Run the detector with PyTorch or an exported ONNX/OpenVINO copy")
+    parser.add_argument("--batch-size", type=int, default=1, help="Number of frames sent to the detector per forward pass")
+    parser.add_argument("--tiled", action="store_true", help="Detect on overlapping full-resolution tiles that wrap around the seam")
+    parser.add_argument("--video-reader", choices=VIDEO_READERS, default="opencv", help="Decode with OpenCV, or with an ffmpeg pipe that scales inside the decoder")
+    parser.add_argument("--decode-width", type=int, default=None, help="Decode the frames sent to the detector at this width, e.g. 1920")
+    parser.add_argument("--decode-threads", type=int, default=0, help="ffmpeg decoder threads, 0 lets ffmpeg choose")
+    parser.add_argument("--assignment", choices=ASSIGNMENT_MODES, default="optimal", help="Match tracks to detections with one assignment per frame, or the original greedy order")
+    parser.add_argument("--tracker-engine", choices=TRACKER_ENGINES, default="overlap", help="Track by box overlap and decay, or with a constant-velocity Kalman motion model")
+
+    args = parser.parse_args()
+
+    redetect_range(args.video, args.json_path, args.start, args.end, batch_size=args.batch_size, weights=args.weights,
+                   imgsz=args.imgsz, conf=args.conf, iou=args.iou, backend=args.backend, tiled=args.tiled,
+                   video_reader=args.video_reader, decode_width=args.decode_width, decode_threads=args.decode_threads, assignment=args.assignment, tracker_engine=args.tracker_engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ from GazeXR import (
 )
 import math
 from utils.scaleCoordinates import scale_coords
+from utils.modelRegistry import configure_registry
+from utils.detectorBackends import DETECTOR_BACKENDS
+from utils.videoReader import VIDEO_READERS
+from utils.assignment import ASSIGNMENT_MODES
+from utils.kalmanTracker import TRACKER_ENGINES
 from ultralytics import YOLO
 import numpy as np
 import matplotlib.pyplot as plt
@@ -16,17 +21,36 @@ import cv2
 import os
 import torch
 
-def process_video(video_path):
+def process_video(video_path, save_rotated=False, batch_size=1, weights="yolov8x.pt", use_cache=True, stride=1, tiled=False, pipelined=False, shards=1, rotation_samples=8, motion_threshold=None, backend="torch", roi_band=None, imgsz=1920, cascade_weights=None, track_guided=False, checkpoint_every=500, video_reader="opencv", decode_width=None, decode_threads=0, assignment="optimal", online_tracking=False, tracker_engine="overlap"):
     # Step 1: Run detection on the video
     print(f"Running detection on video: {video_path}")
-    output_path, results, rotate_amount = run_detection(video_path)
+    output_path, results, rotate_amount = run_detection(video_path, save_rotated=save_rotated, batch_size=batch_size, weights=weights, use_cache=use_cache, stride=stride, tiled=tiled, pipelined=pipelined, shards=shards, rotation_samples=rotation_samples, motion_threshold=motion_threshold, backend=backend, roi_band=roi_band, imgsz=imgsz, cascade_weights=cascade_weights, track_guided=track_guided, checkpoint_every=checkpoint_every, video_reader=video_reader, decode_width=decode_width, decode_threads=decode_threads, online_tracking=online_tracking, assignment=assignment, tracker_engine=tracker_engine)
 
     # Step 2: ReID on the detected output
     print(f"Running reID on the detected video: {output_path}")
-    json_path, video_results_path = reID(output_path, results, rotate_amount)
+    json_path, video_results_path = reID(output_path, results, rotate_amount, source_video=video_path, assignment=assignment, tracker_engine=tracker_engine)
 
     return json_path
 
+def parse_roi_band(value):
+    # "auto" learns the band from the rotation samples, "top:bottom" fixes it in pixel rows
+    if value == "auto":
+        return value
+    try:
+        top, bottom = (int(row) for row in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'auto' or 'top:bottom', got '{value}'")
+    return top, bottom
+
+def parse_imgsz(value):
+    # "auto" picks the inference resolution from the size of the people in the video
+    if value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'auto' or a size in pixels, got '{value}'")
+
 def process_folder(json_path, csv_folder):
     # Step 3: Loop through all CSV files in the folder
     for filename in os.listdir(csv_folder):
@@ -49,14 +73,37 @@ def main():
     parser = argparse.ArgumentParser(description="Process a video and generate graphs for each CSV in a folder.")
     parser.add_argument("video", help="Path to the video file")
     parser.add_argument("csv_folder", help="Path to the folder containing CSV files")
+    parser.add_argument("--save-rotated", action="store_true", help="Also write the rotated intermediate video to disk")
+    parser.add_argument("--batch-size", type=int, default=1, help="Number of frames sent to the detector per forward pass")
+    parser.add_argument("--weights", default="yolov8x.pt", help="Detector weights to load")
+    parser.add_argument("--max-models", type=int, default=2, help="Maximum number of detector models kept loaded at once")
+    parser.add_argument("--max-model-memory", type=float, default=4, help="GiB of model parameters kept loaded at once before the least recently used model is dropped")
+    parser.add_argument("--no-cache", action="store_true", help="Always run the detector instead of reusing cached detections")
+    parser.add_argument("--stride", type=int, default=1, help="Detect every Nth frame and interpolate the boxes in between")
+    parser.add_argument("--tiled", action="store_true", help="Detect on overlapping full-resolution tiles that wrap around the seam")
+    parser.add_argument("--pipelined", action="store_true", help="Run decoding, rotation and inference on separate threads")
+    parser.add_argument("--shards", type=int, default=1, help="Split the video into this many segments detected in parallel processes")
+    parser.add_argument("--rotation-samples", type=int, default=8, help="Number of frames sampled to choose the seam rotation")
+    parser.add_argument("--motion-threshold", type=float, default=None, help="Reuse the previous detections when the scene changed less than this (gray levels)")
+    parser.add_argument("--backend", choices=DETECTOR_BACKENDS, default="torch", help="Run the detector with PyTorch or an exported ONNX/OpenVINO copy")
+    parser.add_argument("--imgsz", type=parse_imgsz, default=1920, help="Detector input size in pixels, or 'auto' to choose it from the person size")
+    parser.add_argument("--cascade-weights", default=None, help="Light detector run on every frame, e.g. yolov8n.pt, --weights then only runs on ambiguous frames")
+    parser.add_argument("--track-guided", action="store_true", help="Detect in crops around the people of the previous frame, with a full-frame detection every 30 frames")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="Frames per resumable checkpoint chunk, 0 disables checkpointing")
+    parser.add_argument("--roi-band", type=parse_roi_band, default=None, help="Only detect on a band of rows, 'auto' or 'top:bottom' in pixels")
+    parser.add_argument("--video-reader", choices=VIDEO_READERS, default="opencv", help="Decode with OpenCV, or with an ffmpeg pipe that scales inside the decoder")
+    parser.add_argument("--decode-width", type=int, default=None, help="Decode the frames sent to the detector at this width, e.g. 1920")
+    parser.add_argument("--decode-threads", type=int, default=0, help="ffmpeg decoder threads, 0 lets ffmpeg choose")
+    parser.add_argument("--assignment", choices=ASSIGNMENT_MODES, default="optimal", help="Match tracks to detections with one assignment per frame, or the original greedy order")
+    parser.add_argument("--online-tracking", action="store_true", help="Track every frame as soon as it is detected instead of after the whole video")
+    parser.add_argument("--tracker-engine", choices=TRACKER_ENGINES, default="overlap", help="Track by box overlap and decay, or with a constant-velocity Kalman motion model")
     
     # Parse arguments
     args = parser.parse_args()
+    configure_registry(max_models=args.max_models, max_bytes=int(args.max_model_memory * 1024 ** 3))
 
     # Step 1: Process the video
-    #json_path = process_video(args.video)
-    json_path = 'bounding_boxes_rotated_Molnar_M_Amb_Clip2_logo.json'
-    input("JSON file created. Press Enter to continue processing CSV files...")
+    json_path = process_video(args.video, save_rotated=args.save_rotated, batch_size=args.batch_size, weights=args.weights, use_cache=not args.no_cache, stride=args.stride, tiled=args.tiled, pipelined=args.pipelined, shards=args.shards, rotation_samples=args.rotation_samples, motion_threshold=args.motion_threshold, backend=args.backend, roi_band=args.roi_band, imgsz=args.imgsz, cascade_weights=args.cascade_weights, track_guided=args.track_guided, checkpoint_every=args.checkpoint_every, video_reader=args.video_reader, decode_width=args.decode_width, decode_threads=args.decode_threads, assignment=args.assignment, online_tracking=args.online_tracking, tracker_engine=args.tracker_engine)
     # Step 2: Process the folder with CSV files
     process_folder(json_path, args.csv_folder)
 
@@ -1,3 +1,4 @@
+import os
 import cv2
 import json
 
@@ -27,13 +28,15 @@ class VideoAnnotator:
             return temp.get("boxes", [])
 
     def save_bboxes(self):
-        dump_boxes_with_rotate = {
-        "boxes": self.bboxes,
-        "rotate_amount": self.rotate_amount
-    }
-    # Step 3: Open a file in binary write mode
-        with open(bbox_file_path, 'w') as file:
+        # Update the loaded document in place, so metadata and patch records survive
+        with open(self.bbox_file_path, 'r') as file:
+            dump_boxes_with_rotate = json.load(file)
+        dump_boxes_with_rotate["boxes"] = self.bboxes
+        dump_boxes_with_rotate["rotate_amount"] = self.rotate_amount
+        temp_path = self.bbox_file_path + ".tmp"
+        with open(temp_path, 'w') as file:
             json.dump(dump_boxes_with_rotate, file, indent=4)  # Optionally use indent for pretty-printing
+        os.replace(temp_path, self.bbox_file_path)
 
 
     def calculate_resize_ratio(self):
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from utils.trackState import GAP_BOX, resume_tracks
+
+FRAME_WIDTH = 3840
+
+
+def person(id_, x, decay=0):
+    return {"box": [x, 500, 100, 200], "id": id_, "decay": decay, "largestOverlap": 0}
+
+
+def test_resume_after_removed_id():
+    # fix_IDs removed id 3 from the whole file, id 4 is still there
+    frames = [[person(1, 500), person(2, 1500), person(4, 2500)]] * 3
+    tracks, next_id, gap_ids = resume_tracks(frames, 2)
+    assert next_id == 4
+    assert tracks.boxes["id"].tolist() == [0, 1, 2, 3]
+    assert tuple(tracks[2]["box"]) == GAP_BOX
+    assert tracks[3]["box"][0] == 2500
+    assert gap_ids.tolist() == [3]
+
+
+def test_resume_after_swapped_ids():
+    frames = [[person(2, 500), person(1, 1500)], [person(2, 500), person(1, 1500), person(5, 2500)]]
+    tracks, next_id, gap_ids = resume_tracks(frames, 1)
+    assert next_id == 5
+    assert tracks[0]["box"][0] == 1500
+    assert tracks[1]["box"][0] == 500
+    assert gap_ids.tolist() == [3, 4, 5]
+
+
+@pytest.mark.parametrize("assignment", ["optimal", "greedy"])
+@pytest.mark.parametrize("engine", ["overlap", "kalman"])
+@pytest.mark.parametrize("stored, expected", [
+    # id 3 removed: the others keep their ids, the new person takes the id after the largest
+    ([person(1, 500), person(2, 1500), person(4, 2500)], [1, 2, 4, 5]),
+    # ids 1 and 2 swapped: each person keeps the id it was given, also after not being seen for a frame
+    ([person(2, 500), person(1, 1500), person(3, 2500)], [2, 1, 3, 4]),
+])
+def test_redetect_resumes_by_id(assignment, engine, stored, expected):
+    GazeXR = pytest.importorskip("GazeXR")
+    tracks, next_id, gap_ids = resume_tracks([stored, stored], 1)
+    xs = np.array([500, 1500, 2500, 2000])
+    detections = np.column_stack((xs, np.full((4, 3), [500, 100, 200]))).astype(float)
+    # The person at 1500 is missed in the first re-detected frame
+    frames = [detections[[0, 2, 3]], detections, detections, detections]
+    tracked, _ = GazeXR.track_frames(frames, tracks, next_id, len(tracks), FRAME_WIDTH,
+                                     assignment=assignment, engine=engine)
+    for frame in tracked:
+        frame = frame[~np.isin(frame["id"], gap_ids)]
+        assert len(set(frame["id"].tolist())) == len(frame)
+    # The kalman engine stores the filtered box, so look the people up by the nearest x
+    ids = {int(xs[np.argmin(np.abs(xs - box["box"][0]))]): int(box["id"]) for box in tracked[-1]
+           if box["decay"] == 0}
+    assert [ids[x] for x in xs] == expected
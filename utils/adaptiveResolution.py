@@ -0,0 +1,53 @@
+import math
+import numpy as np
+
+# Model input sizes tried by the auto mode, all multiples of the 32 pixel YOLO stride
+IMGSZ_CANDIDATES = (640, 960, 1280, 1600, 1920, 2240, 2560, 3200)
+REFERENCE_IMGSZ = 1920
+
+
+def person_heights(frames_detections):
+    """Heights in source pixels of all person boxes in (N, 6) x1, y1, x2, y2, conf, cls arrays."""
+    heights = [detections[:, 3] - detections[:, 1] for detections in frames_detections if len(detections)]
+    return np.concatenate(heights) if heights else np.zeros(0, dtype=np.float32)
+
+
+def input_size(imgsz, frame_width, frame_height):
+    """(width, height) of the letterboxed model input for a frame, the long side scaled to imgsz."""
+    scale = imgsz / max(frame_width, frame_height)
+    return imgsz, int(math.ceil(min(frame_width, frame_height) * scale / 32) * 32)
+
+
+def choose_imgsz(frames_detections, frame_width, frame_height, target_height=64, percentile=5,
+                 candidates=IMGSZ_CANDIDATES, fallback=REFERENCE_IMGSZ):
+    """
+    Smallest candidate imgsz at which the small people still are target_height pixels tall.
+
+    The model sees the frame scaled by imgsz / frame_width, so a person h pixels
+    tall in the source is h * imgsz / frame_width pixels tall at the model input.
+    "Small" is the given percentile of the probed person heights rather than the
+    minimum, so one partly occluded box does not force the largest size. Returns a
+    dict with the chosen imgsz and its expected cost relative to REFERENCE_IMGSZ;
+    fallback is used when nobody was detected.
+    """
+    heights = person_heights(frames_detections)
+    long_side = max(frame_width, frame_height)
+    if len(heights):
+        smallest = float(np.percentile(heights, percentile))
+        needed = target_height * long_side / max(smallest, 1.0)
+        imgsz = next((size for size in sorted(candidates) if size >= needed), max(candidates))
+    else:
+        smallest = None
+        imgsz = fallback
+    width, height = input_size(imgsz, frame_width, frame_height)
+    reference_width, reference_height = input_size(REFERENCE_IMGSZ, frame_width, frame_height)
+    return {
+        "imgsz": int(imgsz),
+        "target_person_height": target_height,
+        "probed_people": int(len(heights)),
+        "small_person_height": smallest,
+        "small_person_height_at_imgsz": smallest * imgsz / long_side if smallest is not None else None,
+        "input_pixels": width * height,
+        # Convolution cost grows with the number of input pixels
+        "relative_cost": width * height / (reference_width * reference_height),
+    }
@@ -0,0 +1,163 @@
+import numpy as np
+from utils.boxGeometry import as_boxes, overlap_areas, center_distances
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# "greedy" is the original reID matching, "optimal" solves each frame as one assignment problem
+ASSIGNMENT_MODES = ("optimal", "greedy")
+
+# Overlap matches cost about 1 at most, distance matches at least this much minus the edge bonus, so the
+# solver only trades an overlap for a distance match when it pairs up more boxes
+DISTANCE_COST_OFFSET = 1000
+
+
+def _hungarian(cost):
+    """Minimum-cost assignment of every row of an (n, m) cost matrix with n <= m, as column per row."""
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    row_of = np.zeros(m + 1, dtype=int)  # 1-based row assigned to each column, 0 when free
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        row_of[0] = i
+        j0 = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        # Grow a shortest augmenting path from row i until it reaches a free column
+        while True:
+            used[j0] = True
+            i0 = row_of[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, min_reduced[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_columns = np.flatnonzero(used)
+            u[row_of[used_columns]] += delta
+            v[used_columns] -= delta
+            min_reduced[1:][free] -= delta
+            j0 = j1
+            if row_of[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            row_of[j0] = row_of[j1]
+            j0 = j1
+    columns = np.zeros(n, dtype=int)
+    assigned = np.flatnonzero(row_of[1:])
+    columns[row_of[1:][assigned] - 1] = assigned
+    return columns
+
+
+def solve_linear_assignment(cost):
+    """Rows and columns of a minimum-cost assignment of a rectangular cost matrix, like scipy's."""
+    if cost.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    if cost.shape[0] > cost.shape[1]:
+        columns, rows = solve_linear_assignment(cost.T)
+        order = np.argsort(rows)
+        return rows[order], columns[order]
+    return np.arange(cost.shape[0]), _hungarian(cost)
+
+
+def greedy_assignment(cost, feasible):
+    """Pair rows and columns cheapest feasible pair first, for problems too large to solve exactly."""
+    rows, columns = np.nonzero(feasible)
+    order = np.argsort(cost[rows, columns], kind="stable")
+    used_rows, used_columns, pairs = set(), set(), []
+    for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+        if row not in used_rows and column not in used_columns:
+            pairs.append((row, column))
+            used_rows.add(row)
+            used_columns.add(column)
+    return pairs
+
+
+def components(feasible):
+    """Groups of (rows, columns) that share no feasible pair with any other group."""
+    num_rows, num_columns = feasible.shape
+    parent = list(range(num_rows + num_columns))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for row, column in zip(*np.nonzero(feasible)):
+        parent[find(int(row))] = find(num_rows + int(column))
+    groups = {}
+    for row in range(num_rows):
+        groups.setdefault(find(row), ([], []))[0].append(row)
+    for column in range(num_columns):
+        groups.setdefault(find(num_rows + column), ([], []))[1].append(column)
+    return [(rows, columns) for rows, columns in groups.values() if rows and columns]
+
+
+def assign(cost, feasible, max_component=64):
+    """
+    Minimum-cost matching of rows to columns that only uses feasible pairs.
+
+    The gated problem falls apart into groups of boxes that could be confused
+    with each other, and each group is solved on its own. A group with more than
+    max_component rows or columns is matched greedily, so one crowded frame costs
+    at most a few max_component**3 steps. Returns a list of (row, column) pairs.
+    """
+    pairs = []
+    infeasible_cost = np.abs(cost[feasible]).sum() + 1 if feasible.any() else 1
+    for rows, columns in components(feasible):
+        block = np.ix_(rows, columns)
+        if max(len(rows), len(columns)) > max_component:
+            matched = greedy_assignment(cost[block], feasible[block])
+        else:
+            # Infeasible pairs cost more than any set of feasible ones, and are dropped afterwards
+            sub_cost = np.where(feasible[block], cost[block], infeasible_cost)
+            matched = zip(*solve_linear_assignment(sub_cost))
+        pairs.extend((rows[r], columns[c]) for r, c in matched if feasible[rows[r], columns[c]])
+    return sorted(pairs)
+
+
+def track_costs(track_boxes, track_decay, frame_boxes, frame_width, left_margin, right_margin,
+                min_overlap=0.1, decay_penalty=700, max_distance=200, edge_bonus=100):
+    """
+    Cost of giving each detection of a frame the id of each track, with the gating reID has always used.
+
+    Returns (cost, feasible, overlap). A pair is an overlap match when the track
+    is away from the seam margins, the boxes overlap by at least min_overlap of
+    either box, and the area left after the decay penalty of long-unseen tracks is
+    above -1; it costs one minus that area relative to the larger box. Any other
+    pair is a distance match when the wrap-aware centre distance, minus edge_bonus
+    for tracks in the margins, is below max_distance and the detection does not
+    jump across the seam; it costs DISTANCE_COST_OFFSET plus that distance.
+    overlap holds the area after the penalty, which reID stores as largestOverlap.
+    """
+    track_boxes, frame_boxes = as_boxes(track_boxes), as_boxes(frame_boxes)
+    track_decay = np.asarray(track_decay, dtype=float)
+    track_area = track_boxes[:, 2] * track_boxes[:, 3]
+    frame_area = frame_boxes[:, 2] * frame_boxes[:, 3]
+
+    areas = overlap_areas(track_boxes, frame_boxes, frame_width)
+    track_on_edge = (track_boxes[:, 0] < left_margin) | (track_boxes[:, 0] > right_margin)
+    overlap = areas - np.where(track_decay > 3, decay_penalty * track_decay, 0)[:, None]
+    overlap_match = ((areas > 0) & ~track_on_edge[:, None]
+                     & ((areas >= min_overlap * track_area[:, None]) | (areas >= min_overlap * frame_area[None, :]))
+                     & (overlap > -1))
+
+    distances = center_distances(track_boxes, frame_boxes, frame_width) - np.where(track_on_edge, edge_bonus, 0)[:, None]
+    # Same rule as check_for_box_jumping_to_edges: a detection in a margin does not take a track on that side
+    frame_x, track_x = frame_boxes[None, :, 0], track_boxes[:, 0:1]
+    jumps = ((frame_x < left_margin) & (track_x < frame_width / 2)) | ((frame_x > right_margin) & (track_x > frame_width / 2))
+    distance_match = ~overlap_match & (distances < max_distance) & ~jumps
+
+    larger_area = np.maximum(track_area[:, None], frame_area[None, :])
+    overlap_cost = 1 - np.divide(overlap, larger_area, out=np.zeros_like(overlap), where=larger_area > 0)
+    cost = np.where(overlap_match, overlap_cost, DISTANCE_COST_OFFSET + distances)
+    return cost, overlap_match | distance_match, np.where(overlap_match, overlap, 0)
@@ -0,0 +1,141 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Boxes are (N, 4) arrays of x, y, w, h in pixels of a frame that wraps around
+# horizontally, points are (N, 2) arrays of x, y. Every function compares all
+# rows of its first argument with all rows of its second and returns an (M, N)
+# array. The pairwise kernels run through numba when it is installed.
+USE_JIT = njit is not None
+
+
+def as_boxes(boxes, dtype=np.float64):
+    return np.asarray(boxes, dtype=dtype).reshape(-1, 4)
+
+
+def as_points(points):
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+def _interval_overlap(a1, a2, b1, b2):
+    """Length of the overlap of [a1, a2] and [b1, b2], 0 when they are apart."""
+    return np.maximum(np.minimum(a2, b2) - np.maximum(a1, b1), 0)
+
+
+def _overlap_areas_numpy(boxes1, boxes2, frame_width, overlap_margin):
+    x1, y1, w1, h1 = (boxes1[:, k:k + 1] for k in range(4))
+    x2, y2, w2, h2 = (boxes2[None, :, k] for k in range(4))
+    heights = _interval_overlap(y1, y1 + h1, y2, y2 + h2)
+    areas = _interval_overlap(x1, x1 + w1, x2, x2 + w2) * heights
+    # A box near an edge is also compared with its copy on the far side of the seam
+    shift = np.where(x1 < overlap_margin, frame_width,
+                     np.where(x1 + w1 > frame_width - overlap_margin, -frame_width, 0)).astype(boxes1.dtype)
+    wrapped = _interval_overlap(x1 + shift, x1 + shift + w1, x2, x2 + w2) * heights
+    return np.where(shift != 0, np.maximum(areas, wrapped), areas)
+
+
+def _center_distances_numpy(boxes1, boxes2, frame_width):
+    cx1, cy1 = boxes1[:, 0:1] + boxes1[:, 2:3] / 2, boxes1[:, 1:2] + boxes1[:, 3:4] / 2
+    cx2, cy2 = boxes2[None, :, 0] + boxes2[None, :, 2] / 2, boxes2[None, :, 1] + boxes2[None, :, 3] / 2
+    dx = np.abs(cx2 - cx1)
+    dx = np.minimum(dx, frame_width - dx)
+    dy = np.abs(cy2 - cy1)
+    return np.sqrt(dx ** 2 + dy ** 2)
+
+
+if USE_JIT:
+    @njit(cache=True)
+    def _overlap_areas_jit(boxes1, boxes2, frame_width, overlap_margin):
+        areas = np.zeros((boxes1.shape[0], boxes2.shape[0]))
+        for i in range(boxes1.shape[0]):
+            x1, y1, w1, h1 = boxes1[i, 0], boxes1[i, 1], boxes1[i, 2], boxes1[i, 3]
+            shift = 0.0
+            if x1 < overlap_margin:
+                shift = frame_width
+            elif x1 + w1 > frame_width - overlap_margin:
+                shift = -frame_width
+            for j in range(boxes2.shape[0]):
+                x2, y2, w2, h2 = boxes2[j, 0], boxes2[j, 1], boxes2[j, 2], boxes2[j, 3]
+                height = min(y1 + h1, y2 + h2) - max(y1, y2)
+                if height <= 0:
+                    continue
+                width = max(min(x1 + w1, x2 + w2) - max(x1, x2), 0.0)
+                if shift != 0:
+                    width = max(width, min(x1 + shift + w1, x2 + w2) - max(x1 + shift, x2))
+                areas[i, j] = width * height
+        return areas
+
+    @njit(cache=True)
+    def _center_distances_jit(boxes1, boxes2, frame_width):
+        distances = np.empty((boxes1.shape[0], boxes2.shape[0]))
+        for i in range(boxes1.shape[0]):
+            cx1, cy1 = boxes1[i, 0] + boxes1[i, 2] / 2, boxes1[i, 1] + boxes1[i, 3] / 2
+            for j in range(boxes2.shape[0]):
+                cx2, cy2 = boxes2[j, 0] + boxes2[j, 2] / 2, boxes2[j, 1] + boxes2[j, 3] / 2
+                dx = abs(cx2 - cx1)
+                dx = min(dx, frame_width - dx)
+                dy = abs(cy2 - cy1)
+                distances[i, j] = np.sqrt(dx ** 2 + dy ** 2)
+        return distances
+
+
+def overlap_areas(boxes1, boxes2, frame_width, overlap_margin=50, dtype=np.float64):
+    """
+    Intersection areas of every pair of boxes.
+
+    A box of boxes1 within overlap_margin of the left or right edge is also
+    intersected with boxes2 from the other side of the seam, keeping the larger
+    area, the same rule reID has always used. dtype=np.float32
+    computes in single precision, like reID did on YOLO's float32 boxes, and
+    always runs through numpy.
+    """
+    boxes1, boxes2 = as_boxes(boxes1, dtype), as_boxes(boxes2, dtype)
+    if USE_JIT and boxes1.dtype == np.float64:
+        return _overlap_areas_jit(boxes1, boxes2, float(frame_width), float(overlap_margin))
+    return _overlap_areas_numpy(boxes1, boxes2, frame_width, overlap_margin)
+
+
+def box_ious(boxes1, boxes2, frame_width):
+    """Wrap-aware intersection over union of every pair of boxes."""
+    boxes1, boxes2 = as_boxes(boxes1), as_boxes(boxes2)
+    x1, y1, w1, h1 = (boxes1[:, k:k + 1] for k in range(4))
+    x2, y2, w2, h2 = (boxes2[None, :, k] for k in range(4))
+    # Comparing with both wrapped copies catches any box that crosses the seam
+    widths = np.maximum.reduce([_interval_overlap(x1 + shift, x1 + shift + w1, x2, x2 + w2)
+                                for shift in (-frame_width, 0, frame_width)])
+    areas = widths * _interval_overlap(y1, y1 + h1, y2, y2 + h2)
+    union = (boxes1[:, 2] * boxes1[:, 3])[:, None] + (boxes2[:, 2] * boxes2[:, 3])[None, :] - areas
+    return np.divide(areas, union, out=np.zeros_like(areas), where=union > 0)
+
+
+def point_distances(points1, points2, frame_width):
+    """Euclidean distance of every pair of points, going the shorter way around the seam."""
+    points1, points2 = as_points(points1), as_points(points2)
+    dx = np.abs(points2[None, :, 0] - points1[:, 0:1])
+    dx = np.minimum(dx, frame_width - dx)
+    dy = np.abs(points2[None, :, 1] - points1[:, 1:2])
+    return np.sqrt(dx ** 2 + dy ** 2)
+
+
+def center_distances(boxes1, boxes2, frame_width):
+    """Wrap-aware distance between the centres of every pair of boxes."""
+    boxes1, boxes2 = as_boxes(boxes1), as_boxes(boxes2)
+    if USE_JIT:
+        return _center_distances_jit(boxes1, boxes2, float(frame_width))
+    return _center_distances_numpy(boxes1, boxes2, frame_width)
+
+
+def points_in_boxes(points, boxes, frame_width):
+    """Whether every point lies strictly inside every box, also when the box crosses the seam."""
+    points, boxes = as_points(points), as_boxes(boxes)
+    dx = (points[:, 0:1] - boxes[None, :, 0]) % frame_width
+    dy = points[:, 1:2] - boxes[None, :, 1]
+    return (dx > 0) & (dx < boxes[None, :, 2]) & (dy > 0) & (dy < boxes[None, :, 3])
+
+
+def unrotate_x(x, rotate_amount, frame_width):
+    """x in a frame rolled by rotate_amount, back in the original video's pixels."""
+    return (np.asarray(x) - rotate_amount) % frame_width
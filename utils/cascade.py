@@ -0,0 +1,81 @@
+from utils.detectionStore import detections_to_array
+
+
+class DetectorCascade:
+    """
+    Two-tier detection: a light model on every frame, the full model only where it is unsure.
+
+    A frame is escalated to the heavy model when the light model returns a box
+    below escalate_conf, when its box count differs from the number of people in
+    the previous frame, or when a box lies within seam_margin of the 0/width seam
+    (where boxes are cut in two and reID is most fragile). Otherwise the light
+    detections at or above min_conf are used as they are.
+    """
+
+    def __init__(self, frame_width, escalate_conf=0.6, min_conf=0.5, seam_margin=None):
+        self.frame_width = frame_width
+        self.escalate_conf = escalate_conf
+        self.min_conf = min_conf
+        # Same edge margin reID uses for boxes about to jump across the seam
+        self.seam_margin = frame_width / 14 if seam_margin is None else seam_margin
+        self.expected_count = None
+        self.frames = 0
+        self.escalated = 0
+        self.reasons = {"low_conf": 0, "count": 0, "seam": 0}
+
+    def low_confidence(self, detections):
+        return bool(len(detections)) and detections[:, 4].min() < self.escalate_conf
+
+    def escalation_reason(self, detections):
+        """Why the light detections of a frame are not trusted, or None if they are."""
+        if self.low_confidence(detections):
+            return "low_conf"
+        if self.expected_count is not None and len(detections) != self.expected_count:
+            return "count"
+        if len(detections) and ((detections[:, 0] < self.seam_margin)
+                                | (detections[:, 2] > self.frame_width - self.seam_margin)).any():
+            return "seam"
+        return None
+
+    def detect(self, frames, light_detect, heavy_detect):
+        """
+        Detect a batch of frames, sending only the escalated ones through heavy_detect.
+
+        Both detect callables map a list of frames to per-frame results. Returns
+        (N, 6) detection arrays in frame order, the same whatever the batch size:
+        escalated frames are sent to heavy_detect together until a frame needs
+        their people count to be judged.
+        """
+        results = [detections_to_array(boxes) for boxes in light_detect(frames)]
+        escalate = []
+        for index, detections in enumerate(results):
+            self.frames += 1
+            if escalate and not self.low_confidence(detections):
+                # The count check compares with the full model's count of the frame before
+                self.escalate(frames, results, escalate, heavy_detect)
+            reason = self.escalation_reason(detections)
+            if reason is None:
+                results[index] = detections[detections[:, 4] >= self.min_conf]
+                self.expected_count = len(results[index])
+            else:
+                self.reasons[reason] += 1
+                escalate.append(index)
+        if escalate:
+            self.escalate(frames, results, escalate, heavy_detect)
+        return results
+
+    def escalate(self, frames, results, indices, heavy_detect):
+        """Replace the results at indices by the full model's and empty indices."""
+        self.escalated += len(indices)
+        for index, boxes in zip(indices, heavy_detect([frames[index] for index in indices])):
+            results[index] = detections_to_array(boxes)
+        self.expected_count = len(results[indices[-1]])
+        indices.clear()
+
+    def as_dict(self):
+        return {"frames": self.frames, "escalated": self.escalated, **self.reasons}
+
+    def report(self):
+        share = self.escalated / self.frames * 100 if self.frames else 0.0
+        reasons = ", ".join(f"{count} {reason}" for reason, count in self.reasons.items())
+        return f"Cascade escalated {self.escalated} of {self.frames} frames ({share:.1f}%) to the full model: {reasons}"
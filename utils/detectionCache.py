@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import numpy as np
+from utils.detectionStore import DetectionStore, as_detection_store
+
+DEFAULT_CACHE_DIR = ".detection_cache"
+
+
+def video_fingerprint(video_path, chunk_size=1 << 20):
+    """
+    Fast content fingerprint of a video file.
+
+    Hashes the file size together with chunks from the start, middle and end of
+    the file instead of the whole file, so fingerprinting a multi-gigabyte clip
+    takes milliseconds.
+    """
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(video_path, 'rb') as file:
+        for offset in (0, max(0, size // 2 - chunk_size // 2), max(0, size - chunk_size)):
+            file.seek(offset)
+            digest.update(file.read(chunk_size))
+    return digest.hexdigest()
+
+
+def weights_id(weights):
+    """Identify the detector weights by name, plus size and mtime when the file is local."""
+    if os.path.exists(weights):
+        stat = os.stat(weights)
+        return f"{os.path.basename(weights)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return weights
+
+
+def cache_key(fingerprint, **params):
+    payload = json.dumps({"video": fingerprint, **params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class DetectionCache:
+    """
+    On-disk cache of raw per-frame detections.
+
+    Entries are addressed by the video fingerprint plus every detector parameter
+    that changes the output (weights, conf, iou, imgsz, classes, rotate_amount).
+    Each entry is an .npz holding the rows and per-frame offsets of a DetectionStore.
+    The seam rotation, the learned region of interest and the auto-chosen imgsz are
+    cached separately so a hit does not need the model at all.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, f"{key}{extension}")
+
+    def _load_json(self, fingerprint, params, extension):
+        path = self._path(cache_key(fingerprint, **params), extension)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    def _save_json(self, fingerprint, params, extension, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._path(cache_key(fingerprint, **params), extension), 'w') as file:
+            json.dump(entry, file)
+
+    def load_rotation(self, fingerprint, params):
+        entry = self._load_json(fingerprint, params, ".rotation.json")
+        return entry.get("rotate_amount") if entry is not None else None
+
+    def save_rotation(self, fingerprint, params, rotate_amount):
+        self._save_json(fingerprint, params, ".rotation.json", {"rotate_amount": int(rotate_amount)})
+
+    def load_roi_band(self, fingerprint, params):
+        entry = self._load_json(fingerprint, params, ".roi.json")
+        band = entry.get("roi_band") if entry is not None else None
+        return tuple(band) if band is not None else None
+
+    def save_roi_band(self, fingerprint, params, band):
+        self._save_json(fingerprint, params, ".roi.json", {"roi_band": [int(band[0]), int(band[1])]})
+
+    def load_resolution(self, fingerprint, params):
+        return self._load_json(fingerprint, params, ".resolution.json")
+
+    def save_resolution(self, fingerprint, params, resolution):
+        self._save_json(fingerprint, params, ".resolution.json", resolution)
+
+    def load(self, fingerprint, params, rotate_amount):
+        """Return the cached DetectionStore, or None on a miss."""
+        path = self._path(cache_key(fingerprint, rotate_amount=rotate_amount, **params), ".npz")
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as entry:
+                rows = entry["rows"]
+                offsets = entry["offsets"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable detection cache entry {path}: {e}")
+            return None
+        return DetectionStore.from_arrays(rows, offsets)
+
+    def save(self, fingerprint, params, rotate_amount, detections):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(cache_key(fingerprint, rotate_amount=rotate_amount, **params), ".npz")
+        store = as_detection_store(detections)
+        # Write to a temporary file first so an interrupted run never leaves a truncated entry
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, rows=store.rows, offsets=store.offsets)
+        os.replace(temp_path, path)
+        return path
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith((".npz", ".rotation.json", ".roi.json", ".resolution.json")):
+                os.remove(os.path.join(self.cache_dir, filename))
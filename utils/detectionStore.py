@@ -0,0 +1,138 @@
+import numpy as np
+
+
+def detections_to_array(boxes):
+    """
+    Return the detections of one frame as an (N, 6) float32 array of x1, y1, x2, y2, conf, cls.
+
+    Accepts ultralytics Boxes as well as arrays that are already in that layout
+    (e.g. interpolated or tiled detections).
+    """
+    data = boxes.data if hasattr(boxes, "data") else boxes
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+
+class DetectionStore:
+    """
+    Detections of a whole video in one contiguous float32 array.
+
+    Every row is (frame, x, y, w, h, conf) with x, y the top-left corner, the
+    same box layout reID uses. offsets[i]:offsets[i + 1] are the rows of frame i,
+    so a frame is a slice of the array rather than a list of tensor objects.
+    Indexing or iterating the store yields those per-frame row views.
+    metadata holds run-level information reID copies into the output JSON, run_dir
+    the checkpoint directory of the run that produced the detections, if any, and
+    tracks the frames an OnlineTracker already tracked while they were detected.
+    """
+
+    def __init__(self, capacity=4096, frame_width=None):
+        self._rows = np.zeros((capacity, 6), dtype=np.float32)
+        self._offsets = np.zeros(max(2, capacity // 4), dtype=np.int64)
+        self._num_rows = 0
+        self._num_frames = 0
+        self.frame_width = frame_width
+        self.metadata = {}
+        self.run_dir = None
+        self.tracks = None
+
+    def append(self, detections):
+        """Add the next frame from (N, 6) x1, y1, x2, y2, conf, cls detections (or ultralytics Boxes)."""
+        detections = detections_to_array(detections)
+        count = len(detections)
+        self._reserve(self._num_rows + count, self._num_frames + 2)
+        rows = self._rows[self._num_rows:self._num_rows + count]
+        rows[:, 0] = self._num_frames
+        rows[:, 1] = detections[:, 0]
+        rows[:, 2] = detections[:, 1]
+        rows[:, 3] = detections[:, 2] - detections[:, 0]
+        rows[:, 4] = detections[:, 3] - detections[:, 1]
+        rows[:, 5] = detections[:, 4]
+        self._num_rows += count
+        self._num_frames += 1
+        self._offsets[self._num_frames] = self._num_rows
+
+    def _reserve(self, num_rows, num_offsets):
+        if num_rows > len(self._rows):
+            grown = np.zeros((max(num_rows, 2 * len(self._rows)), 6), dtype=np.float32)
+            grown[:self._num_rows] = self._rows[:self._num_rows]
+            self._rows = grown
+        if num_offsets > len(self._offsets):
+            grown = np.zeros(max(num_offsets, 2 * len(self._offsets)), dtype=np.int64)
+            grown[:self._num_frames + 1] = self._offsets[:self._num_frames + 1]
+            self._offsets = grown
+
+    @property
+    def rows(self):
+        return self._rows[:self._num_rows]
+
+    @property
+    def offsets(self):
+        return self._offsets[:self._num_frames + 1]
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.offsets.nbytes
+
+    def __len__(self):
+        return self._num_frames
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._num_frames
+        if not 0 <= index < self._num_frames:
+            raise IndexError("frame index out of range")
+        return self._rows[self._offsets[index]:self._offsets[index + 1]]
+
+    def __iter__(self):
+        for index in range(self._num_frames):
+            yield self[index]
+
+    @property
+    def most_boxes(self):
+        """The largest number of detections in one frame."""
+        return int(np.diff(self.offsets).max()) if self._num_frames else 0
+
+    def boxes(self, index):
+        """(N, 4) x, y, w, h boxes of one frame."""
+        return self[index][:, 1:5]
+
+    @classmethod
+    def from_arrays(cls, rows, offsets, frame_width=None):
+        store = cls(capacity=max(1, len(rows)), frame_width=frame_width)
+        store._reserve(len(rows), len(offsets))
+        store._rows[:len(rows)] = rows
+        store._offsets[:len(offsets)] = offsets
+        store._num_rows = len(rows)
+        store._num_frames = len(offsets) - 1
+        return store
+
+    @classmethod
+    def from_frames(cls, frames, frame_width=None):
+        store = cls(frame_width=frame_width)
+        for detections in frames:
+            store.append(detections)
+        return store
+
+    @classmethod
+    def concatenate(cls, stores, frame_width=None):
+        """Join stores of consecutive video segments, renumbering their frames."""
+        rows, offsets = [], [np.zeros(1, dtype=np.int64)]
+        frame_base, row_base = 0, 0
+        for store in stores:
+            shifted = store.rows.copy()
+            shifted[:, 0] += frame_base
+            rows.append(shifted)
+            offsets.append(store.offsets[1:] + row_base)
+            frame_base += len(store)
+            row_base += len(shifted)
+        rows = np.concatenate(rows) if rows else np.zeros((0, 6), dtype=np.float32)
+        return cls.from_arrays(rows, np.concatenate(offsets), frame_width)
+
+
+def as_detection_store(results, frame_width=None):
+    """Wrap per-frame detection results (e.g. a list of ultralytics Boxes) in a DetectionStore."""
+    if isinstance(results, DetectionStore):
+        return results
+    return DetectionStore.from_frames(results, frame_width)
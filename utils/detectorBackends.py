@@ -0,0 +1,52 @@
+import os
+import shutil
+from ultralytics import YOLO
+
+# "torch" runs the .pt weights directly, the others run an exported copy of them.
+# "int8" is the OpenVINO model quantized by utils/quantization.py (quantize_detector.py)
+DETECTOR_BACKENDS = ("torch", "onnx", "openvino", "int8")
+
+
+def exported_path(weights, backend, imgsz):
+    """Where the exported artifact for these weights lives, next to the weights file."""
+    base = os.path.splitext(weights)[0]
+    if backend == "onnx":
+        return f"{base}_{imgsz}.onnx"
+    if backend == "openvino":
+        return f"{base}_{imgsz}_openvino_model"
+    if backend == "int8":
+        return f"{base}_{imgsz}_int8_openvino_model"
+    raise ValueError(f"Unknown detector backend '{backend}', expected one of {DETECTOR_BACKENDS}")
+
+
+def export_model(weights, backend, imgsz):
+    """
+    Export the weights to the backend's format once and return the artifact path.
+
+    The export is cached next to the weights and named after imgsz, since the
+    exported graph has a fixed input resolution. Later runs reuse it.
+    """
+    target = exported_path(weights, backend, imgsz)
+    if os.path.exists(target):
+        return target
+    if backend == "int8":
+        # Quantization needs calibration frames from our own videos, so it is never done implicitly
+        raise FileNotFoundError(f"No quantized model at {target}, create it with quantize_detector.py first")
+    print(f"Exporting {weights} to {backend} at imgsz={imgsz}, this only happens once")
+    exported = YOLO(weights).export(format=backend, imgsz=imgsz)
+    # ultralytics names the export after the weights only, rename it so every imgsz gets its own
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    return target
+
+
+def load_detector(weights, device, imgsz, backend="torch"):
+    """
+    Load a detector for the given backend.
+
+    Exported models go through the same ultralytics predict call, so classes,
+    conf and iou keep their meaning whatever the backend.
+    """
+    if backend == "torch":
+        return YOLO(weights).to(device)
+    return YOLO(export_model(weights, backend, imgsz), task="detect")
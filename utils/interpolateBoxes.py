@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def wrapped_dx(x1, x2, frame_width):
+    """Signed horizontal offset from x1 to x2 taking the shorter way around the 360 seam."""
+    return (np.asarray(x2) - np.asarray(x1) + frame_width / 2) % frame_width - frame_width / 2
+
+
+def centers(detections):
+    """Centre points of (N, 6) x1, y1, x2, y2, conf, cls detections."""
+    return (detections[:, 0] + detections[:, 2]) / 2, (detections[:, 1] + detections[:, 3]) / 2
+
+
+def match_boxes(start, end, frame_width):
+    """
+    Greedily pair boxes of two frames by wrap-aware centre distance, closest pairs first.
+
+    Returns a list of (start index, end index, distance) tuples.
+    """
+    if len(start) == 0 or len(end) == 0:
+        return []
+    cx1, cy1 = centers(start)
+    cx2, cy2 = centers(end)
+    dx = wrapped_dx(cx1[:, None], cx2[None, :], frame_width)
+    dy = cy2[None, :] - cy1[:, None]
+    distances = np.sqrt(dx ** 2 + dy ** 2)
+
+    pairs = []
+    used_start, used_end = set(), set()
+    for flat_index in np.argsort(distances, axis=None):
+        i, j = np.unravel_index(flat_index, distances.shape)
+        if i in used_start or j in used_end:
+            continue
+        pairs.append((int(i), int(j), float(distances[i, j])))
+        used_start.add(i)
+        used_end.add(j)
+        if len(pairs) == min(len(start), len(end)):
+            break
+    return pairs
+
+
+def interpolate_detections(start, end, steps, frame_width, max_shift=80, max_count_change=0):
+    """
+    Linearly interpolate the detections of the steps frames between two keyframes.
+
+    Box centres move along the shorter way around the seam, width and height are
+    interpolated directly. Returns a list of steps (N, 6) arrays, or None when the
+    keyframes disagree too much to interpolate: the box count changed by more than
+    max_count_change or a matched person moved further than max_shift pixels.
+    Unmatched boxes are held from the nearer keyframe.
+    """
+    if abs(len(start) - len(end)) > max_count_change:
+        return None
+    pairs = match_boxes(start, end, frame_width)
+    if any(distance > max_shift for _, _, distance in pairs):
+        return None
+
+    matched_start = {i for i, _, _ in pairs}
+    matched_end = {j for _, j, _ in pairs}
+    frames = []
+    for step in range(1, steps + 1):
+        t = step / (steps + 1)
+        rows = []
+        for i, j, _ in pairs:
+            a, b = start[i], end[j]
+            w = (1 - t) * (a[2] - a[0]) + t * (b[2] - b[0])
+            h = (1 - t) * (a[3] - a[1]) + t * (b[3] - b[1])
+            cx = ((a[0] + a[2]) / 2 + t * wrapped_dx((a[0] + a[2]) / 2, (b[0] + b[2]) / 2, frame_width)) % frame_width
+            cy = (1 - t) * (a[1] + a[3]) / 2 + t * (b[1] + b[3]) / 2
+            rows.append([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, min(a[4], b[4]), a[5]])
+        held = start if t < 0.5 else end
+        matched = matched_start if t < 0.5 else matched_end
+        rows.extend(held[k] for k in range(len(held)) if k not in matched)
+        frames.append(np.asarray(rows, dtype=np.float32).reshape(-1, 6))
+    return frames
@@ -0,0 +1,157 @@
+import numpy as np
+from utils.assignment import DISTANCE_COST_OFFSET, assign
+from utils.boxGeometry import box_ious, center_distances, overlap_areas
+
+# "overlap" is the overlap and decay matching reID has always used, "kalman" the motion model below
+TRACKER_ENGINES = ("overlap", "kalman")
+
+# Every track's state is its centre x, centre y, width and height plus the
+# velocity of its centre in pixels per frame. Detections measure the first four.
+_TRANSITION = np.eye(6)
+_TRANSITION[0, 4] = _TRANSITION[1, 5] = 1
+
+
+def _wrap(dx, frame_width):
+    return (dx + frame_width / 2) % frame_width - frame_width / 2
+
+
+def _diagonal(variances):
+    """(K, N, N) diagonal matrices from (K, N) variances."""
+    matrices = np.zeros(variances.shape + variances.shape[-1:])
+    np.einsum("kii->ki", matrices)[:] = variances
+    return matrices
+
+
+class KalmanTracker:
+    """
+    Constant-velocity Kalman filters for all tracks at once, in the style of SORT.
+
+    Every frame the filters predict where each track has moved, the predictions
+    are matched to the detections by wrap-aware IoU (or, for fast motion and
+    people reappearing after an occlusion, by centre distance relative to the
+    person's height), and the matched filters are corrected by their detection.
+    Horizontal positions and innovations wrap around the seam. Noise scales with
+    the box height as in DeepSORT. A track unseen for more than max_coast frames
+    stops moving and waits where it was last predicted. Filters are indexed like
+    the Tracks table, by track id.
+    """
+
+    def __init__(self, frame_width, iou_threshold=0.3, max_distance=0.5, max_coast=15, position_noise=1 / 20,
+                 velocity_noise=1 / 160):
+        self.frame_width = frame_width
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_coast = max_coast
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+        self.mean = np.zeros((0, 6))
+        self.covariance = np.zeros((0, 6, 6))
+        self.misses = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.mean)
+
+    def initiate(self, boxes):
+        """Start a filter at rest for each (N, 4) x, y, w, h box."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        mean = np.zeros((len(boxes), 6))
+        mean[:, 0] = (boxes[:, 0] + boxes[:, 2] / 2) % self.frame_width
+        mean[:, 1] = boxes[:, 1] + boxes[:, 3] / 2
+        mean[:, 2:4] = boxes[:, 2:4]
+        heights = boxes[:, 3:4]
+        std = np.hstack((np.repeat(2 * self.position_noise * heights, 4, axis=1),
+                         np.repeat(10 * self.velocity_noise * heights, 2, axis=1)))
+        self.mean = np.vstack((self.mean, mean))
+        self.covariance = np.concatenate((self.covariance, _diagonal(std ** 2)))
+        self.misses = np.concatenate((self.misses, np.zeros(len(boxes), dtype=np.int64)))
+
+    def predict(self):
+        """Move every filter on by one frame, tracks lost for more than max_coast frames stay put."""
+        lost = self.misses > self.max_coast
+        self.mean[lost, 4:] = 0
+        moving = ~lost
+        mean, covariance = self.mean[moving], self.covariance[moving]
+        heights = mean[:, 3:4]
+        std = np.hstack((np.repeat(self.position_noise * heights, 4, axis=1),
+                         np.repeat(self.velocity_noise * heights, 2, axis=1)))
+        mean = mean @ _TRANSITION.T
+        mean[:, 0] %= self.frame_width
+        self.mean[moving] = mean
+        self.covariance[moving] = _TRANSITION @ covariance @ _TRANSITION.T + _diagonal(std ** 2)
+
+    def update(self, indices, boxes):
+        """Correct the filters at indices with their matched (K, 4) x, y, w, h boxes."""
+        if len(indices) == 0:
+            return
+        indices = np.asarray(indices)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        measurement = np.column_stack((boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3] / 2, boxes[:, 2:4]))
+        mean, covariance = self.mean[indices], self.covariance[indices]
+        innovation = measurement - mean[:, :4]
+        innovation[:, 0] = _wrap(innovation[:, 0], self.frame_width)
+        noise = _diagonal(np.repeat((self.position_noise * mean[:, 3:4]) ** 2, 4, axis=1))
+        projected = covariance[:, :4, :4] + noise
+        # K = P H^T S^-1, with H picking the first four state entries
+        gain = np.linalg.solve(projected, covariance[:, :4, :]).transpose(0, 2, 1)
+        mean = mean + np.einsum("kij,kj->ki", gain, innovation)
+        mean[:, 0] %= self.frame_width
+        self.mean[indices] = mean
+        self.covariance[indices] = covariance - gain @ projected @ gain.transpose(0, 2, 1)
+        self.misses[indices] = 0
+
+    def boxes(self, indices=slice(None)):
+        """x, y, w, h boxes of the filters, with x in [0, frame_width)."""
+        mean = self.mean[indices]
+        return np.column_stack(((mean[:, 0] - mean[:, 2] / 2) % self.frame_width, mean[:, 1] - mean[:, 3] / 2,
+                                mean[:, 2], mean[:, 3]))
+
+    def step(self, frame, tracks, next_id, max_people):
+        """
+        Track one frame: give the boxes of frame (a structured array, see utils.trackState) ids.
+
+        Matched tracks take the filtered box, unmatched detections start new tracks
+        while there are no more tracks than max_people, and every other track keeps
+        its last box with its decay counting up. Returns the next free id.
+        """
+        self.predict()
+        self.misses += 1
+        tracks.boxes["decay"] += 1
+        frame["id"] = -1
+        predicted = self.boxes()
+        detections = frame["box"]
+        ious = box_ious(predicted, detections, self.frame_width)
+        heights = np.maximum(predicted[:, 3:4], 1)
+        distances = center_distances(predicted, detections, self.frame_width) / heights
+        iou_match = ious >= self.iou_threshold
+        distance_match = ~iou_match & (distances < self.max_distance)
+        cost = np.where(iou_match, 1 - ious, DISTANCE_COST_OFFSET + distances)
+        pairs = assign(cost, iou_match | distance_match)
+
+        matched_tracks = [t for t, _ in pairs]
+        matched_boxes = [j for _, j in pairs]
+        self.update(matched_tracks, detections[matched_boxes])
+        areas = overlap_areas(predicted[matched_tracks], detections[matched_boxes], self.frame_width)
+        for k, (t, j) in enumerate(pairs):
+            frame[j]["id"] = tracks[t]["id"]
+            frame[j]["decay"] = 0
+            frame[j]["largestOverlap"] = areas[k, k]
+            tracks[t] = frame[j]
+        if matched_tracks:
+            tracks.boxes["box"][matched_tracks] = self.boxes(matched_tracks)
+
+        for box in frame:
+            if box["id"] == -1 and len(tracks) <= max_people:
+                box["id"] = next_id
+                tracks.append(box)
+                self.initiate(box["box"])
+                next_id += 1
+        return next_id
+
+    def state(self):
+        """The filters as plain lists, for a checkpoint."""
+        return {"mean": self.mean.tolist(), "covariance": self.covariance.tolist(), "misses": self.misses.tolist()}
+
+    def restore(self, state):
+        self.mean = np.asarray(state["mean"], dtype=np.float64).reshape(-1, 6)
+        self.covariance = np.asarray(state["covariance"], dtype=np.float64).reshape(-1, 6, 6)
+        self.misses = np.asarray(state["misses"], dtype=np.int64)
@@ -0,0 +1,93 @@
+import itertools
+import threading
+from collections import OrderedDict
+import torch
+from utils.detectorBackends import load_detector
+
+
+def default_device():
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def model_size_bytes(model):
+    """Approximate memory held by a model's parameters and buffers, 0 if it cannot be measured."""
+    try:
+        module = model.model if hasattr(model, "model") else model
+        tensors = itertools.chain(module.parameters(), module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except (AttributeError, TypeError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded detector models keyed by (weights, device, imgsz, backend).
+
+    Models are loaded once and shared by every caller in the process (GUI Worker
+    tasks, run_batch.py). When more than max_models are loaded, or their combined
+    parameter memory exceeds max_bytes, the least recently used models are evicted.
+    """
+
+    def __init__(self, max_models=2, max_bytes=None, loader=load_detector):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._models = OrderedDict()  # key -> (model, size in bytes)
+        self._lock = threading.Lock()
+
+    def get(self, weights="yolov8x.pt", device=None, imgsz=1920, backend="torch"):
+        if device is None:
+            device = default_device()
+        key = (weights, device, imgsz, backend)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            model = self.loader(weights, device, imgsz, backend)
+            self._models[key] = (model, model_size_bytes(model))
+            self._evict(keep=key)
+            return model
+
+    def total_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def _evict(self, keep):
+        # Drop least recently used models, never the one that was just requested
+        while len(self._models) > 1:
+            too_many = self.max_models is not None and len(self._models) > self.max_models
+            too_big = self.max_bytes is not None and self.total_bytes() > self.max_bytes
+            if not (too_many or too_big):
+                break
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def keys(self):
+        with self._lock:
+            return list(self._models.keys())
+
+
+# Shared by everything running in this process
+model_registry = ModelRegistry(max_models=2, max_bytes=4 * 1024 ** 3)
+
+
+def get_model(weights="yolov8x.pt", device=None, imgsz=1920, backend="torch"):
+    return model_registry.get(weights, device, imgsz, backend)
+
+
+def configure_registry(max_models=None, max_bytes=None):
+    """Change the eviction limits of the shared registry, evicting immediately if needed."""
+    with model_registry._lock:
+        model_registry.max_models = max_models
+        model_registry.max_bytes = max_bytes
+        if model_registry._models:
+            model_registry._evict(keep=next(reversed(model_registry._models)))
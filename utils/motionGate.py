@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+
+class ChangeGate:
+    """
+    Cheap per-frame scene change detector used to skip detector calls on static frames.
+
+    Each frame is reduced to a small grayscale thumbnail, so every thumbnail pixel
+    is the mean of a block of the original frame. The change score is the largest
+    block difference against the last frame that was actually detected, so a
+    single person moving still registers while compression noise averages out.
+    A detection is forced at least every max_interval frames.
+    """
+
+    def __init__(self, threshold=8.0, max_interval=30, size=(96, 48)):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.size = size
+        self.reference = None
+        self.since_detection = 0
+        self.detected = 0
+        self.skipped = 0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def score(self, thumbnail):
+        return float(np.abs(thumbnail - self.reference).max())
+
+    def should_detect(self, frame):
+        thumbnail = self.thumbnail(frame)
+        if (self.reference is None or self.since_detection + 1 >= self.max_interval
+                or self.score(thumbnail) >= self.threshold):
+            self.reference = thumbnail
+            self.since_detection = 0
+            self.detected += 1
+            return True
+        self.since_detection += 1
+        self.skipped += 1
+        return False
+
+    def as_dict(self):
+        return {"detected": self.detected, "skipped": self.skipped}
+
+    def report(self):
+        total = self.detected + self.skipped
+        share = self.skipped / total * 100 if total else 0.0
+        return f"Motion gating skipped {self.skipped} of {total} frames ({share:.1f}%)"
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class StageStats:
+    """Throughput counters of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.wait_input = 0.0  # Seconds spent waiting for the previous stage
+        self.wait_output = 0.0  # Seconds spent waiting for room in the next queue
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def busy(self):
+        """Seconds the stage spent doing its own work."""
+        return max(0.0, self.elapsed - self.wait_input - self.wait_output)
+
+    @property
+    def throughput(self):
+        """Items per second of busy time, i.e. how fast the stage would run if never starved."""
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy": self.busy,
+            "wait_input": self.wait_input,
+            "wait_output": self.wait_output,
+            "throughput": self.throughput,
+        }
+
+
+class Pipeline:
+    """
+    Run a chain of generator stages on their own threads, connected by bounded queues.
+
+    stages is a list of (name, transform) pairs. The first transform is called with
+    None and produces the items (e.g. decoding a video), every later transform is
+    called with an iterator over the previous stage's output and yields its own.
+    Iterating the pipeline yields the last stage's output in order. Memory stays
+    bounded by queue_depth items between each pair of stages. Exceptions raised
+    in any stage are re-raised in the consuming thread.
+    """
+
+    def __init__(self, stages, queue_depth=4):
+        self.stages = stages
+        self.queue_depth = queue_depth
+        self.stats = [StageStats(name) for name, _ in stages]
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, out_queue, item):
+        while not self._stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, in_queue, stats):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                stats.wait_input += time.perf_counter() - start
+                continue
+            stats.wait_input += time.perf_counter() - start
+            if item is _END:
+                return
+            yield item
+
+    def _run_stage(self, transform, in_queue, out_queue, stats):
+        stats.started = time.perf_counter()
+        try:
+            items = self._read(in_queue, stats) if in_queue is not None else None
+            for item in transform(items):
+                stats.items += 1
+                start = time.perf_counter()
+                delivered = self._put(out_queue, item)
+                stats.wait_output += time.perf_counter() - start
+                if not delivered:
+                    break
+        except BaseException as e:
+            self._error = e
+            self._stop.set()
+        finally:
+            stats.finished = time.perf_counter()
+            # Always let the next stage know there is nothing more coming
+            try:
+                out_queue.put_nowait(_END)
+            except queue.Full:
+                self._put(out_queue, _END)
+
+    def __iter__(self):
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in self.stages]
+        threads = []
+        for index, (name, transform) in enumerate(self.stages):
+            in_queue = queues[index - 1] if index > 0 else None
+            thread = threading.Thread(target=self._run_stage, args=(transform, in_queue, queues[index], self.stats[index]),
+                                      name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            while True:
+                try:
+                    item = queues[-1].get(timeout=0.1)
+                except queue.Empty:
+                    if self._error is not None:
+                        break
+                    # A finished last stage always leaves _END, keep reading until it has been taken
+                    if not threads[-1].is_alive() and queues[-1].empty():
+                        break
+                    continue
+                if item is _END:
+                    break
+                yield item
+        finally:
+            # Stops the upstream stages too when the consumer exits early
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=1)
+        if self._error is not None:
+            raise self._error
+
+    def bottleneck(self):
+        """Name of the stage with the lowest throughput."""
+        measured = [stats for stats in self.stats if stats.items]
+        if not measured:
+            return None
+        return min(measured, key=lambda stats: stats.throughput).name
+
+    def report(self):
+        lines = []
+        for stats in self.stats:
+            lines.append(f"{stats.name}: {stats.items} items, {stats.throughput:.2f} items/s busy, "
+                         f"waited {stats.wait_input:.1f}s for input, {stats.wait_output:.1f}s for output")
+        lines.append(f"bottleneck: {self.bottleneck()}")
+        return "\n".join(lines)
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from utils.detectorBackends import exported_path, load_detector
+from utils.detectionStore import detections_to_array
+from utils.seamRotation import sample_frame_indices
+from utils.tiling import wrapped_intersection
+
+
+def sample_video_frames(video_path, count, start_frame=120):
+    """Decode count frames spread evenly over a video."""
+    cap = cv2.VideoCapture(video_path)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for index in sample_frame_indices(min(start_frame, max(0, num_frames - 1)), num_frames, count):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def write_calibration_dataset(videos, folder, frames_per_video=100):
+    """Write frames sampled from our own videos as a calibration dataset and return its yaml path."""
+    image_folder = os.path.join(folder, "images", "val")
+    os.makedirs(image_folder, exist_ok=True)
+    for video_index, video in enumerate(videos):
+        for frame_index, frame in enumerate(sample_video_frames(video, frames_per_video)):
+            cv2.imwrite(os.path.join(image_folder, f"{video_index}_{frame_index}.jpg"), frame)
+    yaml_path = os.path.join(folder, "calibration.yaml")
+    with open(yaml_path, 'w') as file:
+        file.write(f"path: {os.path.abspath(folder)}\ntrain: images/val\nval: images/val\nnames:\n  0: person\n")
+    return yaml_path
+
+
+def quantize_model(weights, imgsz, calibration_videos, frames_per_video=100):
+    """
+    Post-training quantize the detector to INT8 (OpenVINO) and store it next to the weights.
+
+    The calibration statistics come from frames of calibration_videos rather than
+    COCO, so the quantization ranges match our 360 footage. Returns the path of the
+    quantized model, which the "int8" detector backend loads.
+    """
+    target = exported_path(weights, "int8", imgsz)
+    with tempfile.TemporaryDirectory() as folder:
+        yaml_path = write_calibration_dataset(calibration_videos, folder, frames_per_video)
+        exported = YOLO(weights).export(format="openvino", imgsz=imgsz, int8=True, data=yaml_path)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.move(exported, target)
+    print(f"Quantized model saved to {target}")
+    return target
+
+
+def match_recall(reference, candidate, iou_threshold=0.5, frame_width=None):
+    """Count the reference boxes with a candidate box of IoU >= iou_threshold, matched one to one.
+
+    Returns (matched, number of reference boxes).
+    """
+    if len(reference) == 0:
+        return 0, 0
+    if len(candidate) == 0:
+        return 0, len(reference)
+    boxes = np.concatenate((reference, candidate))
+    intersection = wrapped_intersection(boxes, frame_width or 1e9)[:len(reference), len(reference):]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    iou = intersection / (areas[:len(reference), None] + areas[None, len(reference):] - intersection)
+    matched = 0
+    used = set()
+    for i in range(len(reference)):
+        order = np.argsort(-iou[i])
+        for j in order:
+            if iou[i, j] < iou_threshold:
+                break
+            if j not in used:
+                used.add(j)
+                matched += 1
+                break
+    return matched, len(reference)
+
+
+def timed_detections(model, frames, predict_kwargs):
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        result = model.predict(source=frame, verbose=False, **predict_kwargs)[0]
+        detections.append(detections_to_array(result.boxes))
+    elapsed = time.perf_counter() - start
+    return detections, len(frames) / elapsed if elapsed > 0 else 0.0
+
+
+def compare_quantized(weights, imgsz, holdout_video, num_frames=100, conf=0.5, iou=0.4, reference_backend="torch",
+                      report_path=None):
+    """
+    Compare the INT8 model with the FP32 reference on a held-out clip.
+
+    Both run on the same frames with the same classes/conf/iou. Recall is the share
+    of FP32 person boxes that the INT8 model also finds (IoU >= 0.5), precision the
+    share of INT8 boxes that the FP32 model agrees with. The report is written next
+    to the quantized model and returned as a dict.
+    """
+    frames = sample_video_frames(holdout_video, num_frames)
+    predict_kwargs = dict(classes=[0], conf=conf, iou=iou, device='cpu', imgsz=imgsz)
+    reference_model = load_detector(weights, 'cpu', imgsz, reference_backend)
+    quantized_model = load_detector(weights, 'cpu', imgsz, "int8")
+    reference, reference_fps = timed_detections(reference_model, frames, predict_kwargs)
+    quantized, quantized_fps = timed_detections(quantized_model, frames, predict_kwargs)
+
+    frame_width = frames[0].shape[1] if frames else None
+    recall_hits = recall_total = precision_hits = precision_total = 0
+    for fp32, int8 in zip(reference, quantized):
+        hits, total = match_recall(fp32, int8, frame_width=frame_width)
+        recall_hits, recall_total = recall_hits + hits, recall_total + total
+        hits, total = match_recall(int8, fp32, frame_width=frame_width)
+        precision_hits, precision_total = precision_hits + hits, precision_total + total
+
+    report = {
+        "holdout_video": holdout_video,
+        "frames": len(frames),
+        "imgsz": imgsz,
+        "reference_backend": reference_backend,
+        "fp32": {"boxes": recall_total, "fps": reference_fps},
+        "int8": {"boxes": precision_total, "fps": quantized_fps},
+        "recall": recall_hits / recall_total if recall_total else None,
+        "precision": precision_hits / precision_total if precision_total else None,
+        "speedup": quantized_fps / reference_fps if reference_fps else None,
+    }
+    if report_path is None:
+        report_path = f"{exported_path(weights, 'int8', imgsz)}_report.json"
+    with open(report_path, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print(f"{'':12}{'FP32':>12}{'INT8':>12}")
+    print(f"{'boxes':12}{recall_total:>12}{precision_total:>12}")
+    print(f"{'frames/s':12}{reference_fps:>12.2f}{quantized_fps:>12.2f}")
+    print(f"person-box recall of INT8 vs FP32: {report['recall']}, precision: {report['precision']}")
+    print(f"Report saved to {report_path}")
+    return report
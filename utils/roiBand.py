@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def band_from_detections(frames_detections, frame_height, margin=0.15):
+    """
+    Vertical (top, bottom) band that contains the people seen in the sampled frames.
+
+    frames_detections are (N, 6) x1, y1, x2, y2, conf, cls arrays. The band spans
+    the highest box top to the lowest box bottom, padded by margin times its
+    height on both sides so people walking towards the camera still fit, and
+    clamped to the frame. Returns None when nobody was detected in any sample.
+    """
+    frames_detections = [detections for detections in frames_detections if len(detections)]
+    if not frames_detections:
+        return None
+    boxes = np.concatenate(frames_detections)
+    top, bottom = float(boxes[:, 1].min()), float(boxes[:, 3].max())
+    padding = (bottom - top) * margin
+    return clamp_band((top - padding, bottom + padding), frame_height)
+
+
+def clamp_band(band, frame_height):
+    """Round a (top, bottom) band to whole rows inside the frame."""
+    top, bottom = band
+    top = int(max(0, np.floor(top)))
+    bottom = int(min(frame_height, np.ceil(bottom)))
+    if bottom <= top:
+        raise ValueError(f"Empty region of interest {band} for a frame of height {frame_height}")
+    return top, bottom
+
+
+def crop_band(frame, band):
+    """Rows [top, bottom) of the frame, a view so no pixels are copied."""
+    top, bottom = band
+    return frame[top:bottom]
+
+
+def shift_detections(detections, dy):
+    """Move (N, 6) band detections dy pixels down into full-frame coordinates."""
+    if len(detections) == 0 or dy == 0:
+        return detections
+    detections = detections.copy()
+    detections[:, [1, 3]] += dy
+    return detections
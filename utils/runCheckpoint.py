@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import numpy as np
+from utils.detectionStore import DetectionStore
+
+
+class RunCancelled(Exception):
+    """Raised when a checkpointed run is cancelled, its completed chunks stay on disk."""
+
+
+class RunCheckpoint:
+    """
+    Append-only record of a detection and tracking run, so an interrupted run can resume.
+
+    The run directory holds chunks of at most chunk_size frames and a
+    manifest.json listing the chunks that were written completely. Detection
+    chunks are .npz files with the rows and offsets of a DetectionStore, tracking
+    chunks are the JSON frames reID produces, and the manifest keeps the tracker
+    state after the last tracking chunk. Chunk files and the manifest are written
+    to a temporary name first, so a crash leaves at worst an unlisted file.
+    """
+
+    def __init__(self, run_dir, chunk_size=500, params=None):
+        self.run_dir = run_dir
+        self.manifest = self._read_manifest()
+        if self.manifest is None:
+            self.manifest = {"chunk_size": chunk_size, "params": params or {}, "detections": [],
+                             "detection_complete": False, "tracks": [], "tracker": None}
+        # A resumed run keeps the chunk size it was started with
+        self.chunk_size = self.manifest["chunk_size"]
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.run_dir, "manifest.json")
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable run manifest {self.manifest_path}: {e}")
+            return None
+
+    def _write_manifest(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(self.manifest, file)
+        os.replace(temp_path, self.manifest_path)
+
+    @property
+    def detected_frames(self):
+        return sum(chunk["frames"] for chunk in self.manifest["detections"])
+
+    @property
+    def detection_complete(self):
+        return self.manifest["detection_complete"]
+
+    def load_detections(self, frame_width=None):
+        """DetectionStore of all complete detection chunks in frame order."""
+        stores = []
+        for chunk in self.manifest["detections"]:
+            with np.load(os.path.join(self.run_dir, chunk["file"])) as entry:
+                stores.append(DetectionStore.from_arrays(entry["rows"], entry["offsets"]))
+        return DetectionStore.concatenate(stores, frame_width)
+
+    def append_detections(self, store):
+        """Write the frames of store as the next detection chunk."""
+        if len(store) == 0:
+            return
+        os.makedirs(self.run_dir, exist_ok=True)
+        filename = f"detections_{len(self.manifest['detections']):05d}.npz"
+        temp_path = os.path.join(self.run_dir, filename + ".tmp.npz")
+        np.savez(temp_path, rows=store.rows, offsets=store.offsets)
+        os.replace(temp_path, os.path.join(self.run_dir, filename))
+        self.manifest["detections"].append({"file": filename, "start": self.detected_frames, "frames": len(store)})
+        self._write_manifest()
+
+    def finish_detections(self):
+        self.manifest["detection_complete"] = True
+        self._write_manifest()
+
+    @property
+    def tracked_frames(self):
+        return sum(chunk["frames"] for chunk in self.manifest["tracks"])
+
+    @property
+    def tracker_state(self):
+        """(current_boxes, next id) after the last tracking chunk, or None before the first one."""
+        state = self.manifest["tracker"]
+        return None if state is None else (state["current_boxes"], state["id_for_box"])
+
+    @property
+    def filter_state(self):
+        """Motion model state after the last tracking chunk, if the tracker has one (see KalmanTracker.state)."""
+        state = self.manifest["tracker"]
+        return None if state is None else state.get("filters")
+
+    def load_tracks(self):
+        frames = []
+        for chunk in self.manifest["tracks"]:
+            with open(os.path.join(self.run_dir, chunk["file"]), 'r') as file:
+                frames.extend(json.load(file))
+        return frames
+
+    def append_tracks(self, frames, current_boxes, id_for_box, filters=None):
+        """Write tracked JSON frames as the next tracking chunk together with the tracker state after them."""
+        if not frames:
+            return
+        os.makedirs(self.run_dir, exist_ok=True)
+        filename = f"tracks_{len(self.manifest['tracks']):05d}.json"
+        temp_path = os.path.join(self.run_dir, filename + ".tmp")
+        with open(temp_path, 'w') as file:
+            json.dump(frames, file)
+        os.replace(temp_path, os.path.join(self.run_dir, filename))
+        self.manifest["tracks"].append({"file": filename, "start": self.tracked_frames, "frames": len(frames)})
+        self.manifest["tracker"] = {"current_boxes": current_boxes, "id_for_box": id_for_box}
+        if filters is not None:
+            self.manifest["tracker"]["filters"] = filters
+        self._write_manifest()
+
+    def remove(self):
+        """Delete the run directory once the run's output has been written."""
+        if os.path.isdir(self.run_dir):
+            shutil.rmtree(self.run_dir)
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def sample_frame_indices(start_frame, num_frames, count):
+    """count frame indices spread evenly over [start_frame, num_frames), always including start_frame."""
+    if num_frames <= start_frame:
+        return [start_frame]
+    count = max(1, min(count, num_frames - start_frame))
+    return sorted({int(index) for index in np.linspace(start_frame, num_frames - 1, count)})
+
+
+def coverage_histogram(frames_detections, frame_width):
+    """
+    Number of person boxes covering each pixel column, summed over the sampled frames.
+
+    frames_detections are (N, 6) x1, y1, x2, y2, conf, cls arrays. Boxes that run
+    past either edge wrap around to the other side.
+    """
+    # Difference array over columns, integrated with a cumulative sum at the end
+    difference = np.zeros(frame_width + 1, dtype=np.int64)
+    for detections in frames_detections:
+        for x1, x2 in detections[:, [0, 2]].tolist():
+            left = int(np.floor(x1)) % frame_width
+            span = min(frame_width, max(1, int(np.ceil(x2 - x1))))
+            right = left + span
+            difference[left] += 1
+            if right <= frame_width:
+                difference[right] -= 1
+            else:
+                difference[frame_width] -= 1
+                difference[0] += 1
+                difference[right - frame_width] -= 1
+    return np.cumsum(difference[:frame_width])
+
+
+def least_occupied_column(coverage, window):
+    """
+    Centre of the widest stretch of the least covered columns.
+
+    The coverage is first smoothed with a circular window so the result is the
+    middle of a wide gap rather than a single empty column squeezed between two people.
+    """
+    frame_width = len(coverage)
+    window = max(1, min(int(window), frame_width))
+    padded = np.concatenate((coverage, coverage[:window]))
+    sums = np.cumsum(np.concatenate(([0], padded)))
+    # smoothed[c] is the coverage of the window centred on column c
+    smoothed = np.roll(sums[window:window + frame_width] - sums[:frame_width], window // 2)
+    is_min = smoothed == smoothed.min()
+    if is_min.all():
+        return frame_width // 2
+
+    # Longest circular run of minimal columns, starting the scan just after a non-minimal one
+    start = int(np.argmin(is_min))
+    best_length, best_start, run_length, run_start = 0, 0, 0, 0
+    for offset in range(1, frame_width + 1):
+        column = (start + offset) % frame_width
+        if is_min[column]:
+            if run_length == 0:
+                run_start = column
+            run_length += 1
+            if run_length > best_length:
+                best_length, best_start = run_length, run_start
+        else:
+            run_length = 0
+    return (best_start + best_length // 2) % frame_width
+
+
+def rotation_from_detections(frames_detections, frame_width, window=None):
+    """
+    Horizontal roll that moves the least occupied column onto the 0/width seam.
+
+    Returns None when nobody was detected in any sample.
+    """
+    frames_detections = [detections for detections in frames_detections if len(detections)]
+    if not frames_detections:
+        return None
+    if window is None:
+        widths = np.concatenate([detections[:, 2] - detections[:, 0] for detections in frames_detections])
+        window = float(np.median(widths))
+    coverage = coverage_histogram(frames_detections, frame_width)
+    seam_column = least_occupied_column(coverage, window)
+    return int(frame_width - seam_column) % frame_width
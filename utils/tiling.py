@@ -0,0 +1,125 @@
+import math
+import numpy as np
+
+
+def tile_origins(frame_width, frame_height, tile_size, overlap):
+    """
+    Top-left corners of overlapping tile_size tiles covering an equirectangular frame.
+
+    Columns wrap around the 360 seam, so the last column starts near the right edge
+    and continues at x = 0. Rows are clamped to the frame height.
+    """
+    step = max(1, tile_size - overlap)
+    columns = max(1, math.ceil(frame_width / step))
+    xs = [(i * step) % frame_width for i in range(columns)]
+    if tile_size >= frame_height:
+        ys = [0]
+    else:
+        rows = math.ceil((frame_height - overlap) / step)
+        ys = sorted({min(i * step, frame_height - tile_size) for i in range(rows)})
+    return [(x, y) for y in ys for x in xs]
+
+
+def cut_tile(frame, x, y, tile_size):
+    """Crop a tile at (x, y), wrapping horizontally across the seam when it runs past the right edge."""
+    frame_width = frame.shape[1]
+    rows = frame[y:y + tile_size]
+    if x + tile_size <= frame_width:
+        return rows[:, x:x + tile_size]
+    return np.concatenate((rows[:, x:], rows[:, :x + tile_size - frame_width]), axis=1)
+
+
+def wrapped_intersection(boxes, frame_width):
+    """Pairwise intersection areas of (N, 4+) x1, y1, x2, y2 boxes, also checking shifts of one frame width."""
+    best = np.zeros((len(boxes), len(boxes)), dtype=np.float32)
+    for shift in (-frame_width, 0, frame_width):
+        x_left = np.maximum(boxes[:, None, 0], boxes[None, :, 0] + shift)
+        x_right = np.minimum(boxes[:, None, 2], boxes[None, :, 2] + shift)
+        y_top = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+        y_bottom = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+        area = np.clip(x_right - x_left, 0, None) * np.clip(y_bottom - y_top, 0, None)
+        best = np.maximum(best, area)
+    return best
+
+
+def touches_inner_edge(detections, x, y, tile_size, frame_height, tolerance=2):
+    """
+    Which (N, 6) detections of the tile at (x, y) run into a tile border that is not a frame border.
+
+    Those boxes may only show part of a person. Left and right borders always cut
+    through the picture since the frame wraps around, the top and bottom ones
+    only when the tile does not reach the top or bottom of the frame.
+    """
+    tile_height = min(tile_size, frame_height - y)
+    truncated = (detections[:, 0] <= tolerance) | (detections[:, 2] >= tile_size - tolerance)
+    if y > 0:
+        truncated |= detections[:, 1] <= tolerance
+    if y + tile_height < frame_height:
+        truncated |= detections[:, 3] >= tile_height - tolerance
+    return truncated
+
+
+def wrap_nms(detections, frame_width, threshold=0.5, tiles=None, truncated=None):
+    """
+    Non-maximum suppression over (N, 6) detections that treats the frame as a cylinder.
+
+    Overlap is measured as intersection over the smaller box. Given the tile each
+    detection came from, only detections of different tiles suppress each other,
+    so people the detector told apart within one tile (for instance one standing
+    behind the other) are all kept. Boxes not cut by a tile border (see
+    truncated) win over cut ones, then larger boxes over smaller ones, so a person
+    cut in half by a tile border is suppressed by the complete box from the
+    neighbouring tile however confident the detector was about the half.
+    """
+    if len(detections) == 0:
+        return detections
+    tiles = np.arange(len(detections)) if tiles is None else np.asarray(tiles)
+    truncated = np.zeros(len(detections), dtype=bool) if truncated is None else np.asarray(truncated)
+    areas = (detections[:, 2] - detections[:, 0]) * (detections[:, 3] - detections[:, 1])
+    order = np.lexsort((-detections[:, 4], -areas, truncated))
+    detections, tiles, areas = detections[order], tiles[order], areas[order]
+    overlap = wrapped_intersection(detections, frame_width) / np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-6)
+    overlap[tiles[:, None] == tiles[None, :]] = 0
+    keep = []
+    suppressed = np.zeros(len(detections), dtype=bool)
+    for i in range(len(detections)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= overlap[i] > threshold
+    return detections[keep]
+
+
+def merge_tile_detections(tile_detections, origins, frame_width, nms_threshold=0.5, tile_size=None, frame_height=None,
+                          drop_truncated=False):
+    """
+    Map per-tile (N, 6) detections back to frame coordinates and merge duplicates across tile borders.
+
+    With tile_size and frame_height, boxes cut by an inner tile border lose
+    against the complete box of the same person from another tile, or are
+    dropped altogether with drop_truncated.
+    """
+    merged, tiles, truncated = [], [], []
+    for tile, (detections, (x, y)) in enumerate(zip(tile_detections, origins)):
+        if len(detections) == 0:
+            continue
+        cut = np.zeros(len(detections), dtype=bool)
+        if tile_size is not None:
+            cut = touches_inner_edge(detections, x, y, tile_size, frame_height)
+        if drop_truncated:
+            detections, cut = detections[~cut], cut[~cut]
+            if len(detections) == 0:
+                continue
+        truncated.append(cut)
+        shifted = detections.copy()
+        shifted[:, [0, 2]] += x
+        shifted[:, [1, 3]] += y
+        # Keep the left edge inside the frame, boxes may still extend past the right edge
+        wrapped = shifted[:, 0] >= frame_width
+        shifted[wrapped, 0] -= frame_width
+        shifted[wrapped, 2] -= frame_width
+        merged.append(shifted)
+        tiles.append(np.full(len(detections), tile))
+    if not merged:
+        return np.zeros((0, 6), dtype=np.float32)
+    return wrap_nms(np.concatenate(merged), frame_width, nms_threshold, np.concatenate(tiles), np.concatenate(truncated))
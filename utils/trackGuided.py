@@ -0,0 +1,104 @@
+import numpy as np
+from utils.detectionStore import detections_to_array
+from utils.interpolateBoxes import centers, match_boxes, wrapped_dx
+from utils.tiling import cut_tile, merge_tile_detections
+
+
+class TrackGuidedDetector:
+    """
+    Detect people only in crops around where they are expected to be.
+
+    Every person found in the previous frame is moved by their velocity between
+    the two previous frames, and a crop_size square centred on that prediction is
+    cut out at full resolution, wrapping around the seam. The crops of a frame go
+    through the detector as one batch and their boxes are mapped back to frame
+    coordinates, leaving out boxes cut by a crop border. The whole frame is
+    detected every full_interval frames to pick up people entering the scene, and
+    whenever the crops cannot be trusted: nobody to follow, a person too large for
+    a crop, or fewer people found than expected.
+    """
+
+    def __init__(self, frame_width, crop_size=640, full_interval=30, margin=0.25, nms_threshold=0.5):
+        self.frame_width = frame_width
+        self.crop_size = crop_size
+        self.full_interval = full_interval
+        self.margin = margin
+        self.nms_threshold = nms_threshold
+        self.previous = None
+        self.before_previous = None
+        self.since_full = 0
+        self.full_frames = 0
+        self.crop_frames = 0
+        self.full_pixels = 0
+        self.crop_pixels = 0
+
+    def predicted_boxes(self):
+        """The previous frame's boxes moved on by each person's last displacement."""
+        predicted = self.previous.copy()
+        if self.before_previous is None:
+            return predicted
+        for i, j, _ in match_boxes(self.before_previous, self.previous, self.frame_width):
+            cx1, cy1 = centers(self.before_previous[i:i + 1])
+            cx2, cy2 = centers(self.previous[j:j + 1])
+            predicted[j, [0, 2]] += wrapped_dx(cx1[0], cx2[0], self.frame_width)
+            predicted[j, [1, 3]] += cy2[0] - cy1[0]
+        return predicted
+
+    def crop_origins(self, boxes, frame_height):
+        """Top-left corners of the crops around boxes, or None if a padded box does not fit in a crop."""
+        widths = (boxes[:, 2] - boxes[:, 0]) * (1 + 2 * self.margin)
+        heights = (boxes[:, 3] - boxes[:, 1]) * (1 + 2 * self.margin)
+        if (widths > self.crop_size).any() or (heights > min(self.crop_size, frame_height)).any():
+            return None
+        cx, cy = centers(boxes)
+        xs = np.round(cx - self.crop_size / 2).astype(int) % self.frame_width
+        ys = np.clip(np.round(cy - self.crop_size / 2).astype(int), 0, max(0, frame_height - self.crop_size))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def detect_frame(self, frame, full_detect, crop_detect):
+        frame_height = frame.shape[0]
+        origins = None
+        if self.previous is not None and len(self.previous) and self.since_full < self.full_interval:
+            origins = self.crop_origins(self.predicted_boxes(), frame_height)
+        detections = None
+        if origins is not None:
+            crops = [cut_tile(frame, x, y, self.crop_size) for x, y in origins]
+            crop_detections = [detections_to_array(boxes) for boxes in crop_detect(crops)]
+            # Every person is whole in the crop centred on them, a box cut by a crop border is a
+            # neighbour seen in part and would replace their complete box
+            detections = merge_tile_detections(crop_detections, origins, self.frame_width, self.nms_threshold,
+                                               self.crop_size, frame_height, drop_truncated=True)
+            self.crop_pixels += sum(crop.shape[0] * crop.shape[1] for crop in crops)
+            if len(detections) < len(self.previous):
+                # Someone left their crop (or the scene), look at the whole frame instead
+                detections = None
+            else:
+                self.crop_frames += 1
+                self.since_full += 1
+        if detections is None:
+            detections = detections_to_array(full_detect([frame])[0])
+            self.full_pixels += frame.shape[0] * frame.shape[1]
+            self.full_frames += 1
+            self.since_full = 0
+        self.before_previous, self.previous = self.previous, detections
+        return detections
+
+    def detect(self, frames, full_detect, crop_detect):
+        """
+        Detect a batch of frames one after the other, each guided by the frames before it.
+
+        full_detect maps a list of whole frames and crop_detect a list of crops to
+        per-frame results. Returns (N, 6) detection arrays in frame order.
+        """
+        return [self.detect_frame(frame, full_detect, crop_detect) for frame in frames]
+
+    def as_dict(self):
+        return {"full_frames": self.full_frames, "crop_frames": self.crop_frames,
+                "full_pixels": self.full_pixels, "crop_pixels": self.crop_pixels}
+
+    def report(self):
+        frames = self.full_frames + self.crop_frames
+        full_frame_pixels = self.full_pixels / self.full_frames * frames if self.full_frames else 0
+        share = (self.full_pixels + self.crop_pixels) / full_frame_pixels * 100 if full_frame_pixels else 0.0
+        return (f"Track-guided inference detected {self.crop_frames} of {frames} frames from crops, "
+                f"sending {share:.1f}% of the full-frame pixels through the model")
@@ -0,0 +1,126 @@
+import numpy as np
+
+# One tracked box: x, y, w, h, its track id (-1 before it has one), the frames
+# since the track was last matched and the overlap it was matched with.
+# Field names are the keys of the boxes in the output JSON.
+BOX_DTYPE = np.dtype([("box", np.float64, 4), ("id", np.int64), ("decay", np.int64), ("largestOverlap", np.float64)])
+
+# Box of a track id a box file no longer holds (removed or swapped away with fix_IDs),
+# an empty box far above the frame that neither overlap nor distance matching can pick.
+GAP_BOX = (0.0, -1e9, 0.0, 0.0)
+
+
+def frame_boxes(boxes):
+    """Structured array of untracked boxes from (N, 4) x, y, w, h boxes of one frame."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    frame = np.zeros(len(boxes), dtype=BOX_DTYPE)
+    frame["box"] = boxes
+    frame["id"] = -1
+    return frame
+
+
+def boxes_to_json(boxes):
+    """List of {"box", "id", "decay", "largestOverlap"} dicts with plain Python values."""
+    return [{"box": box, "id": id_, "decay": decay, "largestOverlap": overlap}
+            for box, id_, decay, overlap in zip(boxes["box"].tolist(), boxes["id"].tolist(),
+                                                 boxes["decay"].tolist(), boxes["largestOverlap"].tolist())]
+
+
+def boxes_from_json(boxes, id_offset=0):
+    """Structured array from JSON box dicts, adding id_offset to every id."""
+    array = np.zeros(len(boxes), dtype=BOX_DTYPE)
+    for index, box in enumerate(boxes):
+        array[index] = (box["box"], box["id"] + id_offset, box.get("decay", 0), box.get("largestOverlap", 0))
+    return array
+
+
+def frames_to_json(frames):
+    """Frames of structured box arrays (or JSON frames already converted) as JSON frames."""
+    return [frame if isinstance(frame, list) else boxes_to_json(frame) for frame in frames]
+
+
+class Tracks:
+    """
+    The last box of every track, indexed by track id, in one growable structured array.
+
+    Indexing gives a view of a track's record, assigning copies a record into the
+    table, so updating a track never allocates a new object. snapshot() copies the
+    whole table in one go for the output frame.
+    """
+
+    __slots__ = ("_boxes", "_count")
+
+    def __init__(self, boxes=None, capacity=16):
+        boxes = np.zeros(0, dtype=BOX_DTYPE) if boxes is None else np.asarray(boxes, dtype=BOX_DTYPE)
+        self._boxes = np.zeros(max(capacity, len(boxes)), dtype=BOX_DTYPE)
+        self._boxes[:len(boxes)] = boxes
+        self._count = len(boxes)
+
+    @property
+    def boxes(self):
+        """View of the records of all tracks."""
+        return self._boxes[:self._count]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self.boxes[index]
+
+    def __setitem__(self, index, box):
+        self.boxes[index] = box
+
+    def __iter__(self):
+        return iter(self.boxes)
+
+    def append(self, box):
+        if self._count == len(self._boxes):
+            grown = np.zeros(max(16, 2 * len(self._boxes)), dtype=BOX_DTYPE)
+            grown[:self._count] = self._boxes[:self._count]
+            self._boxes = grown
+        self._boxes[self._count] = box
+        self._count += 1
+
+    def snapshot(self, id_offset=1):
+        """Copy of every track's box with ids shifted by id_offset, the way the output JSON numbers them."""
+        snapshot = self.boxes.copy()
+        snapshot["id"] += id_offset
+        return snapshot
+
+    def to_json(self):
+        return boxes_to_json(self.boxes)
+
+    @classmethod
+    def from_json(cls, boxes, id_offset=0):
+        return cls(boxes_from_json(boxes, id_offset))
+
+    @classmethod
+    def from_json_frame(cls, boxes, num_tracks, id_offset=0):
+        """
+        Tracks from one frame of the output JSON, every box in the row of its id plus id_offset.
+
+        Rows up to num_tracks whose id the frame does not hold are gap tracks on
+        GAP_BOX, so the table stays indexed by id after ids were removed or swapped.
+        """
+        tracks = np.zeros(num_tracks, dtype=BOX_DTYPE)
+        tracks["box"] = GAP_BOX
+        tracks["id"] = np.arange(num_tracks)
+        for box in boxes_from_json(boxes, id_offset):
+            tracks[box["id"]] = box
+        return cls(tracks)
+
+
+def resume_tracks(frames, start):
+    """
+    Tracks to carry on from frame start - 1 of the output JSON frames, returns (tracks, next id, gap ids).
+
+    Every frame holds the last box of every track with ids starting at 1, but
+    fix_IDs can remove or swap ids, so the tracks are placed by id and the next
+    id follows the largest one anywhere in the file. The gap ids are the output
+    ids of the gap tracks (see Tracks.from_json_frame), to leave out of the frames
+    tracked from here.
+    """
+    next_id = max((box["id"] for frame in frames for box in frame), default=0)
+    tracks = Tracks.from_json_frame(frames[start - 1], next_id, id_offset=-1)
+    gap_ids = np.setdiff1d(np.arange(1, next_id + 1), [box["id"] for box in frames[start - 1]])
+    return tracks, next_id, gap_ids
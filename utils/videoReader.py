@@ -0,0 +1,191 @@
+import math
+import subprocess
+import cv2
+import numpy as np
+
+# "opencv" decodes at full size and resizes afterwards, "ffmpeg" has the decoder scale in its own threads
+VIDEO_READERS = ("opencv", "ffmpeg")
+
+
+def ffmpeg_executable():
+    """The ffmpeg binary bundled with moviepy (imageio-ffmpeg), or the one on PATH."""
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        return "ffmpeg"
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def decoded_size(source_width, source_height, width=None):
+    """Output (width, height) for a requested decode width, keeping the aspect ratio on even sizes."""
+    if not width or width >= source_width:
+        return source_width, source_height
+    height = int(round(source_height * width / source_width / 2)) * 2
+    return int(width), max(2, height)
+
+
+class OpenCVReader:
+    """
+    cv2.VideoCapture that returns its frames resized to width pixels wide.
+
+    get(CAP_PROP_FRAME_WIDTH / HEIGHT) report the decoded size, source_width and
+    source_height the size stored in the file.
+    """
+
+    def __init__(self, path, width=None):
+        self.cap = cv2.VideoCapture(path)
+        self.source_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.source_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.width, self.height = decoded_size(self.source_width, self.source_height, width)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret and (self.width, self.height) != (self.source_width, self.source_height):
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class FFmpegReader:
+    """
+    Decode through an ffmpeg pipe, scaled to width pixels wide by ffmpeg with threads decoder threads.
+
+    Behaves like cv2.VideoCapture for what the detection code uses: get, set of
+    CAP_PROP_POS_FRAMES (restarts ffmpeg at that frame), read and release. The
+    container metadata comes from a short-lived cv2.VideoCapture.
+    """
+
+    def __init__(self, path, width=None, threads=0):
+        probe = cv2.VideoCapture(path)
+        self.opened = probe.isOpened()
+        self.source_width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.source_height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = probe.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+        probe.release()
+        self.path = path
+        self.width, self.height = decoded_size(self.source_width, self.source_height, width)
+        self.threads = threads
+        self.position = 0
+        self.process = None
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        values = {
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_COUNT: self.frame_count,
+            cv2.CAP_PROP_POS_FRAMES: self.position,
+        }
+        return values.get(prop, 0)
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self._stop()
+        self.position = int(value)
+        return True
+
+    def _start(self):
+        command = [ffmpeg_executable(), "-loglevel", "error", "-threads", str(self.threads)]
+        if self.position > 0 and self.fps > 0:
+            # Seeking before -i is frame accurate when the output is decoded, and much faster
+            command += ["-ss", f"{self.position / self.fps:.6f}"]
+        command += ["-i", self.path, "-an", "-sn", "-vsync", "0"]
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            command += ["-vf", f"scale={self.width}:{self.height}:flags=area"]
+        command += ["-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=self.width * self.height * 3)
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.process is None:
+            self._start()
+        frame_bytes = self.width * self.height * 3
+        data = self.process.stdout.read(frame_bytes)
+        if len(data) < frame_bytes:
+            return False, None
+        self.position += 1
+        return True, np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def _stop(self):
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def release(self):
+        self._stop()
+        self.opened = False
+
+
+def open_video(path, reader="opencv", width=None, threads=0):
+    """
+    Open a video for analysis, decoded at width pixels wide (None keeps the full size).
+
+    Only for frames that go to the detector, rendering keeps using cv2.VideoCapture
+    at full resolution.
+    """
+    if reader == "opencv":
+        return OpenCVReader(path, width)
+    if reader == "ffmpeg":
+        return FFmpegReader(path, width, threads)
+    raise ValueError(f"Unknown video reader '{reader}', expected one of {VIDEO_READERS}")
+
+
+class DecodedGeometry:
+    """
+    Maps between source pixels and the pixels of frames decoded at a reduced size.
+
+    Boxes, rotate_amount and the region of interest are kept in source pixels
+    everywhere else, only the decoded frames and what the detector returns for
+    them use the decoded size.
+    """
+
+    def __init__(self, video, rotate_amount=0):
+        self.scale_x = video.get(cv2.CAP_PROP_FRAME_WIDTH) / video.source_width
+        self.scale_y = video.get(cv2.CAP_PROP_FRAME_HEIGHT) / video.source_height
+        self.width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        rolled = int(round(rotate_amount * self.scale_x))
+        self.rotate_amount = rolled % max(1, self.width)
+        # The decoded roll is rounded to whole pixels, boxes are moved by what the rounding lost
+        self.offset_x = rotate_amount - rolled / self.scale_x
+
+    @property
+    def scaled(self):
+        return self.scale_x != 1 or self.scale_y != 1
+
+    def band(self, band):
+        if band is None:
+            return None
+        top, bottom = band
+        return int(math.floor(top * self.scale_y)), int(math.ceil(bottom * self.scale_y))
+
+    def to_source(self, detections):
+        """(N, 6) detections on decoded frames back in source pixels."""
+        if not self.scaled or len(detections) == 0:
+            return detections
+        detections = detections.copy()
+        detections[:, [0, 2]] = detections[:, [0, 2]] / self.scale_x + self.offset_x
+        detections[:, [1, 3]] /= self.scale_y
+        return detections
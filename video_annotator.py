@@ -1,3 +1,4 @@
+import os
 import sys
 import cv2
 import json
@@ -63,12 +64,15 @@ class VideoAnnotator(QMainWindow):
             return temp.get("boxes", [])
 
     def save_bboxes(self):
-        dump_boxes_with_rotate = {
-            "boxes": self.bboxes,
-            "rotate_amount": self.rotate_amount
-        }
-        with open(self.bbox_file_path, 'w') as file:
+        # Update the loaded document in place, so metadata and patch records survive
+        with open(self.bbox_file_path, 'r') as file:
+            dump_boxes_with_rotate = json.load(file)
+        dump_boxes_with_rotate["boxes"] = self.bboxes
+        dump_boxes_with_rotate["rotate_amount"] = self.rotate_amount
+        temp_path = self.bbox_file_path + ".tmp"
+        with open(temp_path, 'w') as file:
             json.dump(dump_boxes_with_rotate, file, indent=4)
+        os.replace(temp_path, self.bbox_file_path)
 
     def calculate_resize_ratio(self):
         screen_width, screen_height = 800, 600  # Example dimensions